@@ -60,9 +60,14 @@ depending on the type of the Python object.
     array [(1,), int/float] = NONE/BOOL/INT/FLOAT/COMPLEX
         .pickletype         = PICKLE_TYPE
 
+* Longs that fit in 64 bits::
+
+    array [(), int64/uint64] = DATA
+        .pickletype         = LONG
+
 * Basic stream types (``long``, ``str``, ``unicode``).
-  Longs and unicodes are converted to strings (`pickle.encode_long`, utf-8),
-  and strings are converted to arrays of unsigned 8-bit integers:: 
+  Other longs and unicodes are converted to strings (`pickle.encode_long`,
+  utf-8), and strings are converted to arrays of unsigned 8-bit integers:: 
 
     array [(n,), uint8] = DATA
         .pickletype    = LONG/STR/UNICODE
@@ -72,6 +77,104 @@ depending on the type of the Python object.
      At present strings are not stored as HDF5 strings,
      as PyTables appears to chop them off at '\\x00' characters.
 
+* numpy scalars (``numpy.float64``, ``numpy.int32``, ``numpy.bool_``, ...)::
+
+    array [(), same type] = DATA
+        .pickletype       = NS
+
+* numpy record arrays are saved as tables, datetime arrays as int64
+  arrays, and object arrays of strings as variable-length arrays::
+
+    table [(n,), record type] = DATA.ravel()
+        .pickletype          = NR
+        .shape               = "DATA.shape"
+
+    array [DATA.shape, int64] = DATA.view(int64)
+        .pickletype          = NT
+        .dtype               = DATA.dtype.str
+
+    vlarray [(n,), vlstring] = DATA.ravel(), utf-8 encoded if unicode
+        .pickletype          = NO
+        .shape               = "DATA.shape"
+        .strtype             = str/unicode
+
+  Other object arrays are saved as tuples of their elements, but with
+  pickletype NO and the shape attribute. Bool arrays are bit-packed if
+  the `pack_bools` option is given::
+
+    array [(k,), uint8] = numpy.packbits(DATA.ravel())
+        .pickletype          = NB
+        .shape               = "DATA.shape"
+        .packed              = bits
+        .length              = DATA.size
+
+* lists, tuples, sets and frozensets::
+
+    array [(n,), int/float/complex] = DATA # if homogeneous, sets sorted
+        .pickletype = LIST/TUPLE/SE/FS
+        .empty      = 1 #if len(DATA) == 0
+
+    array [(n,), int64/uint64] = DATA # if all longs that fit in 64 bits
+        .pickletype = LIST/TUPLE/SE/FS
+        .long       = 1
+
+    array [(k,), uint8] = numpy.packbits(DATA) # if all bools
+        .pickletype = LIST/TUPLE/SE/FS
+        .packed     = bits
+        .length     = len(DATA)
+
+    array [(n, m, ...), int/float/complex] = DATA # if rectangular nested
+        .pickletype = LIST/TUPLE/SE/FS
+        .nested     = kinds of the inner levels, l/t/a for list/tuple/array
+        # the inner items have no nodes; references to them point to
+        # NAME/_i, NAME/_i/_j, ..., and lists with items saved before
+        # are not packed
+
+    group # if all strs or all unicodes
+        .pickletype = LIST/TUPLE/SE/FS
+        .packed     = str/unicode
+        data        = array for ''.join(DATA), utf-8 encoded if unicode
+        offsets     = array [(n,), int64] of the end offsets of the items
+
+    group # otherwise
+        .pickletype = LIST/TUPLE/SE/FS
+        .length     = len(DATA)
+        _0, _1, ... = nodes for the items
+
+    group # otherwise, if saved with bucket_size and len(DATA) > bucket_size
+        .pickletype  = LIST/TUPLE/SE/FS
+        .length      = len(DATA)
+        .bucket_size = bucket_size
+        _b0/_0, ..., _b0/_{bucket_size-1}, _b1/_{bucket_size}, ...
+                     = nodes for the items
+
+    group # if at least 8 items are instances of one class, with a
+          # __dict__ of ints, longs, floats, complexes, bools, strs,
+          # unicodes or equal-shape arrays and the same keys
+        .pickletype = LIST/TUPLE/SE/FS
+        .length     = len(DATA)
+        .instances  = 1
+        __/cls      = class
+        __/attrs/ATTR = node for [item.ATTR for item in rows], as for lists
+        __/rows     = array [(r,), int64] of the item indices stored in
+                      __/attrs; omitted if all items are
+        _i          = node for each other item DATA[i]
+
+  Items stored in ``__/attrs`` have no nodes of their own; references
+  to them point to ``_i`` all the same.
+
+* scipy.sparse CSR, CSC and COO matrices::
+
+    group
+        .pickletype = SP
+        .format     = csr/csc/coo
+        .shape      = "DATA.shape"
+        data        = compressed array of the nonzero entries
+        indices     = compressed array, csr/csc
+        indptr      = compressed array, csr/csc
+        row         = compressed array, coo
+        col         = compressed array, coo
+
 * dicts::
 
     group
@@ -85,7 +188,48 @@ depending on the type of the Python object.
         __/SURROGATE = node for KEY
          #end if
         #end for
+        __/index     = array [(m, 2), int64] # if m >= 64 surrogate keys
+                     = rows of (crc32-based hash of KEY, N in SURROGATE = _N),
+                       sorted
+
+  Dicts whose keys are not all valid names, and whose keys and values
+  can each be saved as one array as for lists above::
+
+    group
+        .pickletype  = DICT
+        .columns     = 1
+        __/keys      = node for DICT.keys(), as a list
+            .sorted  = 1 # if 64 or more numbers; entries sorted by key
+        __/values    = node for DICT.values(), as a list
+        __/index     = as above, with the rows N of the keys # if 64 or
+                       more other keys
+
+  Other dicts, if saved with bucket_size and longer than it::
+
+    group
+        .pickletype  = DICT
+        .buckets     = n = ceil(len(DICT) / bucket_size)
+        _b0, _b1, ... = groups laid out as dicts, for the entries whose
+                       key hash (as for __/index) modulo n is 0, 1, ...
     
+* subclasses of dict, list and tuple (including namedtuples,
+  ``OrderedDict`` and ``defaultdict``) not customizing pickling::
+
+    group
+        .pickletype         = SC
+        .call_cls           = 1 if the class is called to create an instance
+        .has_reduce_content = 1 if state present
+        __/cls              = class
+        __/base             = node for contents as plain dict/list/tuple
+        __/args             = arguments for the class, if any
+        __/keys             = key order for ordered dicts
+
+        #if state is dict
+        insert entries of dict here as in dict
+        #else
+        __/content          = node for state
+        #endif
+
 * instances::
 
     group
@@ -103,15 +247,41 @@ depending on the type of the Python object.
     
         #if state is dict
         insert entries of dict here as in dict
+        #elif state is (None, dict) as for __slots__ without __dict__
+        .slots              = 1
+        insert entries of dict here as in dict
         #else
         __/content          = node for content
         #endif
 
+  If saved with ``class_table=True``, ``__/cls`` and ``__/func`` of
+  instances and container subclasses are replaced by attributes, and
+  empty ``__/args`` are left out::
+
+        .cls_id             = index of the class in the class table
+        .func_id            = index of the creation func in the class table
+
+  The class table is a packed list of strings (see above) at
+  ``/hdf5pickle_classes``, holding ``module + '\\n' + name`` for each.
+  Its ``data`` and ``offsets`` are extendable (chunked) arrays, appended
+  to as new classes are saved.
+
 * globals (classes, etc)::
 
     array [as for strings] = GLOBAL/EXT4 data locator, as in pickle
         .pickletype        = GLOBAL/EXT4
 
+* strings and non-name dict keys, if saved with ``string_pool=True``::
+
+    array [(), int64] = index of the utf-8 encoded string in the pool
+        .pickletype  = STR/UNICODE
+
+    __/pool = array [(m, 3), int64] # in dicts, instead of __/SURROGATE
+                 = rows of (N in SURROGATE = _N, index in pool, is unicode)
+
+  The pool itself is a packed list of strings (see above) at
+  ``/hdf5pickle_strings``, and is appended to like the class table.
+
 * reference to an object elsewhere::
 
     group
@@ -8,28 +8,47 @@
 # See LICENSE.txt for some legalese.
 
 __all__ = ['dump', 'load', 'Pickler', 'Unpickler',
-           'dump_many', 'load_many']
+           'dump_many', 'load_many', 'dumps', 'loads',
+           'register', 'unregister', 'load_sparse_rows', 'load_item']
 
 __docformat__ = "restructuredtext en"
 
 from copy_reg import dispatch_table
 from copy_reg import _extension_registry, _inverted_registry, _extension_cache
+from copy_reg import _slotnames
 from types import *
-import keyword, marshal
-import tables, numpy, cPickle as pickle, re, struct, sys
+import keyword, marshal, itertools, collections
+import numpy, cPickle as pickle, re, struct, sys, zlib
+
+try:
+    import tables
+except ImportError:
+    # only the h5py backend is available
+    tables = None
 
 from pickle import whichmodule, PicklingError, FLOAT, INT, LONG, NONE, \
      REDUCE, STRING, UNICODE, GLOBAL, DICT, INST, LIST, TUPLE, EXT4, \
      encode_long, decode_long
 
-BOOL    = 'BB'
-REF     = 'RR'
-COMPLEX = 'CC'
+BOOL      = 'BB'
+REF       = 'RR'
+COMPLEX   = 'CC'
+SET       = 'SE'
+FROZENSET = 'FS'
+SUBCLASS  = 'SC'
 
 NUMARRAY = 'NA'
 NUMPY    = 'NP'
 NUMERIC  = 'NU'
 
+NUMPY_SCALAR   = 'NS'
+NUMPY_RECORD   = 'NR'
+NUMPY_DATETIME = 'NT'
+NUMPY_OBJECT   = 'NO'
+NUMPY_BITS     = 'NB'
+
+SPARSE = 'SP'
+
 HIGHEST_PROTOCOL = 2
 """The pickling (programming) protocol supported by this module"""
 
@@ -54,9 +73,13 @@ except ImportError:
 try:
     from tables import checkflavor
 except ImportError:
-    import tables.flavor
-    def checkflavor(flavor, x=None, y=None):
-        return flavor.lower() in tables.flavor.all_flavors
+    if tables is not None:
+        import tables.flavor
+        def checkflavor(flavor, x=None, y=None):
+            return flavor.lower() in tables.flavor.all_flavors
+    else:
+        def checkflavor(flavor, x=None, y=None):
+            raise ValueError(flavor)
 
 ### Check what PyTables supports on this system
 
@@ -102,18 +125,35 @@ try:
 except ImportError:
     pass
 
+SparseMatrixTypes = ()
+try:
+    import scipy.sparse
+    SparseMatrixTypes = (scipy.sparse.csr_matrix, scipy.sparse.csc_matrix,
+                         scipy.sparse.coo_matrix)
+except ImportError:
+    pass
+
 
 HDF5PICKLE_PROTOCOL = 1
 """Identifier for the current HDF5 pickling protocol"""
 
+STRING_POOL_PATH = '/hdf5pickle_strings'
+"""Location of the per-file pool of interned strings"""
+
+CLASS_TABLE_PATH = '/hdf5pickle_classes'
+"""Location of the per-file table of classes and functions"""
+
 #############################################################################
 
 
 class _FileInterface(object):
     """
-    Internal interface to a `tables.File` object.
+    Internal interface to a HDF5 file.
 
-    Includes convenience functions, including type conversion.
+    Includes convenience functions, including type conversion. This is
+    the storage backend protocol: subclasses implement the primitive node
+    operations for a specific HDF5 library, and everything else is done in
+    terms of them, so that all backends produce the same layout.
     """
     def __init__(self, file, type_map=None):
         self.file = file
@@ -121,7 +161,15 @@ class _FileInterface(object):
             self.type_map = {}
         else:
             self.type_map = type_map
-    
+
+    def open_file(cls, filename, mode, latest_format=False):
+        """
+        Open a HDF5 file of the kind this backend handles, optionally
+        with the latest file format.
+        """
+        raise NotImplementedError()
+    open_file = classmethod(open_file)
+
     def  _splitpath(s):
         i = s.rindex('/')
         where, name = s[:i], s[(i+1):]
@@ -129,71 +177,338 @@ class _FileInterface(object):
         return where, name
     _splitpath = staticmethod(_splitpath)
 
-    def set_attr(self, obj, attr, value):
-        if isinstance(obj, tables.Group):
-            obj._f_setAttr(attr, value)
-        else:
-            setattr(obj.attrs, attr, value)
+    ### Primitives; backends need to implement these
 
-    def has_attr(self, obj, attr):
-        try:
-            self.get_attr(obj, attr)
-            return True
-        except AttributeError:
-            return False
+    def set_attr(self, obj, attr, value):
+        raise NotImplementedError()
 
     def get_attr(self, obj, attr):
-        if isinstance(obj, tables.Group):
-            return obj._f_getAttr(attr)
-        else:
-            return getattr(obj.attrs, attr)
+        """Get attribute of a node, or raise AttributeError."""
+        raise NotImplementedError()
 
     def get_path(self, path):
-        return self.file.getNode(path)
+        raise NotImplementedError()
 
     def has_path(self, path):
+        raise NotImplementedError()
+
+    def new_group(self, path):
+        raise NotImplementedError()
+
+    def remove_path(self, path):
+        """Remove a node, and its children if it is a group."""
+        raise NotImplementedError()
+
+    def save_numeric_array(self, path, data):
+        """Save a numpy (or otherwise natively supported) array."""
+        raise NotImplementedError()
+
+    def save_compressed_array(self, path, data):
+        """Save a numpy array chunked and compressed."""
+        raise NotImplementedError()
+
+    def save_extendable_array(self, path, data):
+        """Save a one-dimensional numpy array that can be appended to."""
+        raise NotImplementedError()
+
+    def append_array(self, node, data):
+        """Append a one-dimensional numpy array to an extendable array."""
+        raise NotImplementedError()
+
+    def save_table(self, path, data):
+        """Save a one-dimensional structured numpy array as a table."""
+        raise NotImplementedError()
+
+    def save_vlstrings(self, path, data):
+        """Save a list of strings as a variable-length array."""
+        raise NotImplementedError()
+
+    def load_vlstrings(self, node):
+        raise NotImplementedError()
+
+    def get_pathname(self, node):
+        raise NotImplementedError()
+
+    def get_children(self, node):
+        """List the names of the children of a group node."""
+        raise NotImplementedError()
+
+    def is_array(self, node):
+        raise NotImplementedError()
+
+    def read(self, node):
+        """Read the data of an array node to a numpy array."""
+        raise NotImplementedError()
+
+    def read_slice(self, node, start, stop):
+        """Read rows start:stop of an array node to a numpy array."""
+        raise NotImplementedError()
+
+    def get_dtype(self, node):
+        """Get the numpy dtype, with byte order, of an array node."""
+        raise NotImplementedError()
+
+    def get_filename(self):
+        raise NotImplementedError()
+
+    def get_offset(self, node):
+        """
+        Byte offset of the data of `node` in the file, or None if the
+        data is not stored contiguously and unfiltered.
+        """
+        return None
+
+    def release(self):
+        """
+        Release resources held for loading, such as extra file handles.
+        Called when a top-level load is finished.
+        """
+        pass
+
+    def _read_into(self, node, out):
+        out[...] = self.read(node)
+
+    ### Shared
+
+    def has_attr(self, obj, attr):
         try:
-            self.file.getNode(path)
+            self.get_attr(obj, attr)
             return True
-        except NoSuchNodeError:
+        except AttributeError:
             return False
 
     def save_array(self, path, data):
-        where, name = self._splitpath(path)
         type_ = type(data)
 
         if type_ in (tuple, list, str):
             if len(data) == 0:
-                array = self.file.createArray(
-                    where, name, numpy.array([0], dtype=numpy.int8))
+                array = self.save_numeric_array(
+                    path, numpy.array([0], dtype=numpy.int8))
                 self.set_attr(array, 'empty', 1)
                 return array
             elif type_ in (tuple, list):
                 btype = type(data[0])
+                if btype is bool:
+                    return self.save_bits(path, data)
+                if btype is long:
+                    if set(itertools.imap(type, data)) != set([long]):
+                        raise TypeError
+                    array = self.save_numeric_array(
+                        path, self._long_array(data))
+                    self.set_attr(array, 'long', 1)
+                    return array
                 if not btype in (int, float, complex):
                     raise TypeError
-                for item in data:
-                    if type(item) != btype:
-                        raise TypeError
-            if type_ is str:
-                # FIXME: pytables chops off NULs from strings!
-                #        protect via encoding in 8-bytes
-                return self.file.createArray(where, name, numpy.fromstring(
-                    data, dtype=self.type_map.get(str, numpy.uint8)))
-            return self.file.createArray(where, name, numpy.array(
-                data, dtype=self.type_map.get(btype)))
+                # type scan and conversion both run at C level
+                if set(itertools.imap(type, data)) != set([btype]):
+                    raise TypeError
+                return self.save_numeric_array(path, numpy.fromiter(
+                    data, dtype=self.type_map.get(btype, btype),
+                    count=len(data)))
+            # FIXME: pytables chops off NULs from strings!
+            #        protect via encoding in 8-bytes
+            return self.save_numeric_array(path, numpy.frombuffer(
+                data, dtype=self.type_map.get(str, numpy.uint8)))
         elif type_ in (int, float, complex):
-            return self.file.createArray(where, name, numpy.array(
+            return self.save_numeric_array(path, numpy.array(
                 data, dtype=self.type_map.get(type_)))
         elif type_ in (long,):
-            return self.file.createArray(where, name, numpy.array(
-                data, dtype=self.type_map.get(type_, numpy.object_)))
+            return self.save_numeric_array(path, self._long_array(data))
         else:
             raise TypeError
 
-    def save_numeric_array(self, path, data):
-        where, name = self._splitpath(path)
-        return self.file.createArray(where, name, data)
+    def _long_array(self, data):
+        """
+        Convert longs to an int64 or uint64 array, or raise TypeError if
+        they do not fit.
+        """
+        array = numpy.array(data, dtype=self.type_map.get(long))
+        if not array.dtype.kind in 'iu':
+            raise TypeError
+        return array
+
+    def nested_array(self, data):
+        """
+        Convert a rectangular nested sequence of numbers, or a sequence of
+        equal-shape arrays, to a single N-d array.
+
+        :return: the array, the kinds of the inner levels (l/t/a for
+                 list/tuple/array), and the items of each inner level
+        :raise TypeError: if `data` is not such, or has shared items
+        """
+        kinds = []
+        levels = []
+        seen = set([id(data)])
+        level = data
+        while True:
+            types = set(map(type, level))
+            if len(types) != 1:
+                raise TypeError
+            btype = types.pop()
+            if btype in (int, float, complex):
+                array = numpy.array(data, dtype=self.type_map.get(btype))
+                break
+            elif not btype in (tuple, list, numpy.ndarray):
+                raise TypeError
+            ids = set(map(id, level))
+            if len(ids) != len(level) or not ids.isdisjoint(seen):
+                raise TypeError # shared or recursive items
+            seen.update(ids)
+            levels.append(level)
+            if btype is numpy.ndarray:
+                if (len(set([(x.shape, x.dtype) for x in level])) != 1
+                        or not level[0].dtype.kind in 'biufc'
+                        or level[0].ndim == 0):
+                    raise TypeError
+                kinds.append('a')
+                array = numpy.array(data)
+                break
+            if len(set(map(len, level))) != 1 or len(level[0]) == 0:
+                raise TypeError
+            kinds.append({list: 'l', tuple: 't'}[btype])
+            level = list(itertools.chain(*level))
+        return array, ''.join(kinds), levels
+
+    def save_bits(self, path, data):
+        """
+        Save a homogeneous sequence of bools, or a bool array, packed
+        eight items to a byte.
+        """
+        if type(data) is numpy.ndarray:
+            bits = data.ravel()
+        elif set(itertools.imap(type, data)) != set([bool]):
+            raise TypeError
+        else:
+            bits = numpy.fromiter(data, dtype=numpy.bool_, count=len(data))
+        node = self.save_numeric_array(path, numpy.packbits(bits))
+        self.set_attr(node, 'packed', 'bits')
+        self.set_attr(node, 'length', len(bits))
+        return node
+
+    def load_bits(self, node):
+        data = numpy.unpackbits(numpy.asarray(self.read(node)))
+        return data[:self.get_attr(node, 'length')].view(numpy.bool_)
+
+    def load_bits_item(self, node, i):
+        """Load item `i` of bools saved by `save_bits`, reading one byte."""
+        byte = int(self.read_slice(node, i // 8, i // 8 + 1)[0])
+        return bool(byte >> (7 - i % 8) & 1)
+
+    def save_strings(self, path, data, extendable=False):
+        """
+        Save a homogeneous sequence of strs or unicodes as a group holding
+        the concatenated (utf-8 encoded) strings and their end offsets.
+        If `extendable` is True, more can be added with `append_strings`.
+        """
+        types = set(itertools.imap(type, data))
+        if types == set([unicode]):
+            data = [item.encode('utf-8') for item in data]
+        elif types != set([str]):
+            raise TypeError
+        group = self.new_group(path)
+        self.set_attr(group, 'packed', types.pop().__name__)
+        offsets = numpy.fromiter(itertools.imap(len, data), dtype=numpy.int64,
+                                 count=len(data)).cumsum()
+        if extendable:
+            self.save_extendable_array('%s/data' % path, numpy.frombuffer(
+                ''.join(data), dtype=numpy.uint8))
+            self.save_extendable_array('%s/offsets' % path, offsets)
+        else:
+            self.save_array('%s/data' % path, ''.join(data))
+            self.save_numeric_array('%s/offsets' % path, offsets)
+        return group
+
+    def append_strings(self, node, data):
+        """
+        Append strs or unicodes to a group saved by `save_strings` with
+        extendable=True.
+        """
+        if self.get_attr(node, 'packed') == 'unicode':
+            data = [item.encode('utf-8') for item in data]
+        path = self.get_pathname(node)
+        array = self.get_path('%s/data' % path)
+        end = array.shape[0]
+        self.append_array(array, numpy.frombuffer(''.join(data),
+                                                  dtype=numpy.uint8))
+        offsets = numpy.fromiter(itertools.imap(len, data), dtype=numpy.int64,
+                                 count=len(data)).cumsum()
+        self.append_array(self.get_path('%s/offsets' % path), offsets + end)
+
+    def load_strings(self, node):
+        path = self.get_pathname(node)
+        data = self.load_buffer(self.get_path('%s/data' % path))
+        ends = numpy.asarray(self.read(self.get_path('%s/offsets' % path)))
+        ends = ends.tolist()
+        starts = [0] + ends[:-1]
+        if self.get_attr(node, 'packed') == 'unicode':
+            # decode straight from the buffer, without an interim str
+            return [unicode(buffer(data, i, j - i), 'utf-8')
+                    for i, j in itertools.izip(starts, ends)]
+        return map(data.tostring().__getslice__, starts, ends)
+
+    def load_strings_item(self, node, i):
+        """
+        Load item `i` of strings saved by `save_strings`, reading only its
+        offsets and bytes.
+        """
+        path = self.get_pathname(node)
+        offsets = self.get_path('%s/offsets' % path)
+        if i == 0:
+            start, end = 0, int(self.read_slice(offsets, 0, 1)[0])
+        else:
+            start, end = self.read_slice(offsets, i - 1, i + 1).tolist()
+        if start == end:
+            data = ''
+        else:
+            data = numpy.asarray(self.read_slice(
+                self.get_path('%s/data' % path), start, end)).tostring()
+        if self.get_attr(node, 'packed') == 'unicode':
+            return data.decode('utf-8')
+        return data
+
+    def map_array(self, node):
+        """
+        Return a read-only `numpy.memmap` of the data of `node`, or None
+        if the data cannot be mapped.
+        """
+        offset = self.get_offset(node)
+        if offset is None:
+            return None
+        return numpy.memmap(self.get_filename(), dtype=self.get_dtype(node),
+                            mode='r', offset=offset, shape=tuple(node.shape))
+
+    def read_into(self, node, out):
+        """
+        Read the data of `node` into the preallocated array `out`, which
+        may differ from it in byte order.
+        """
+        if tuple(node.shape) != out.shape:
+            raise ValueError("shape mismatch for %s: %r in file, %r in out"
+                             % (self.get_pathname(node), tuple(node.shape),
+                                out.shape))
+        dtype = self.get_dtype(node)
+        if dtype.newbyteorder('=') != out.dtype.newbyteorder('='):
+            raise ValueError("dtype mismatch for %s: %s in file, %s in out"
+                             % (self.get_pathname(node), dtype, out.dtype))
+        if not out.flags.writeable:
+            raise ValueError("out array for %s is read-only"
+                             % self.get_pathname(node))
+        if out.flags.c_contiguous:
+            self._read_into(node, out)
+        else:
+            out[...] = self.read(node)
+        return out
+
+    def load_buffer(self, node):
+        """
+        Read the bytes of a string saved by `save_array` into a numpy
+        array, which can be decoded or sliced without copying.
+        """
+        if self.has_attr(node, 'empty'):
+            return numpy.zeros((0,), dtype=numpy.uint8)
+        # FIXME: pytables chops off NULs from strings!
+        #        protect via encoding in 8-bytes
+        return numpy.asarray(self.read(node))
 
     def load_array(self, node, type_):
         if type_ in (tuple, list, str):
@@ -201,24 +516,370 @@ class _FileInterface(object):
                 return type_()
             else:
                 if type_ is str:
-                    # FIXME: pytables chops off NULs from strings!
-                    #        protect via encoding in 8-bytes
-                    return numpy.asarray(node.read()).tostring()
-                return type_(node.read())
-        elif type_ in (int, float):
-            return type_(node.read())
+                    return self.load_buffer(node).tostring()
+                if self.has_attr(node, 'packed'):
+                    return type_(self.load_bits(node).tolist())
+                data = numpy.asarray(self.read(node))
+                if self.has_attr(node, 'long'):
+                    return type_(map(long, data.tolist()))
+                return type_(data.tolist())
+        elif type_ in (int, long, float):
+            return type_(self.read(node))
         elif type_ is bool:
-            return type_(numpy.alltrue(node.read()))
+            return type_(numpy.alltrue(self.read(node)))
         elif type_ is complex:
-            data = node.read()
+            data = self.read(node)
             return complex(data[()])
         else:
             raise TypeError()
 
+
+class _TablesFileInterface(_FileInterface):
+    """
+    Interface to a `tables.File` object.
+    """
+    def __init__(self, file, type_map=None):
+        _FileInterface.__init__(self, file, type_map)
+        self._h5file = None
+
+    def open_file(cls, filename, mode, latest_format=False):
+        if latest_format:
+            raise ValueError("latest_format requires the h5py backend")
+        return tables.openFile(filename, mode)
+    open_file = classmethod(open_file)
+
+    def set_attr(self, obj, attr, value):
+        if isinstance(obj, tables.Group):
+            obj._f_setAttr(attr, value)
+        else:
+            setattr(obj.attrs, attr, value)
+
+    def get_attr(self, obj, attr):
+        if isinstance(obj, tables.Group):
+            return obj._f_getAttr(attr)
+        else:
+            return getattr(obj.attrs, attr)
+
+    def get_path(self, path):
+        return self.file.getNode(path)
+
+    def has_path(self, path):
+        try:
+            self.file.getNode(path)
+            return True
+        except NoSuchNodeError:
+            return False
+
     def new_group(self, path):
         where, name = self._splitpath(path)
         return self.file.createGroup(where, name)
 
+    def remove_path(self, path):
+        self.file.removeNode(path, recursive=True)
+
+    def save_numeric_array(self, path, data):
+        where, name = self._splitpath(path)
+        return self.file.createArray(where, name, data)
+
+    def save_compressed_array(self, path, data):
+        if data.size == 0:
+            # zero-sized arrays cannot be chunked
+            return self.save_numeric_array(path, data)
+        where, name = self._splitpath(path)
+        filters = tables.Filters(complevel=5, complib='zlib', shuffle=True)
+        array = self.file.createCArray(where, name,
+                                       tables.Atom.from_dtype(data.dtype),
+                                       data.shape, filters=filters)
+        array[...] = data
+        return array
+
+    def save_extendable_array(self, path, data):
+        where, name = self._splitpath(path)
+        array = self.file.createEArray(where, name,
+                                       tables.Atom.from_dtype(data.dtype),
+                                       (0,))
+        self.append_array(array, data)
+        return array
+
+    def append_array(self, node, data):
+        if len(data):
+            node.append(data)
+
+    def save_table(self, path, data):
+        where, name = self._splitpath(path)
+        return self.file.createTable(where, name, data)
+
+    def save_vlstrings(self, path, data):
+        where, name = self._splitpath(path)
+        array = self.file.createVLArray(where, name, tables.VLStringAtom())
+        for item in data:
+            array.append(item)
+        return array
+
+    def load_vlstrings(self, node):
+        return node.read()
+
+    def get_pathname(self, node):
+        return node._v_pathname
+
+    def get_children(self, node):
+        return list(node._v_children)
+
+    def is_array(self, node):
+        return hasattr(node, 'read')
+
+    def read(self, node):
+        return node.read()
+
+    def read_slice(self, node, start, stop):
+        return node.read(start, stop)
+
+    def get_dtype(self, node):
+        byteorder = {'little': '<', 'big': '>'}.get(node.byteorder, '=')
+        return numpy.dtype(node.atom.dtype).newbyteorder(byteorder)
+
+    def get_filename(self):
+        return self.file.filename
+
+    def get_offset(self, node):
+        # PyTables does not expose dataset offsets, so h5py is used for
+        # looking them up, if available.
+        if not isinstance(node, tables.Array) or node.shape == ():
+            return None
+        if node.chunkshape is not None or node.filters.complevel:
+            return None
+        if self._h5file is None:
+            try:
+                import h5py
+                self._h5file = h5py.File(self.file.filename, 'r')
+            except (ImportError, IOError):
+                return None
+        return self._h5file[node._v_pathname].id.get_offset()
+
+    def release(self):
+        if self._h5file is not None:
+            self._h5file.close()
+            self._h5file = None
+
+    def _read_into(self, node, out):
+        try:
+            node.read(out=out)
+        except TypeError:
+            # PyTables < 3 cannot read into a buffer
+            out[...] = node.read()
+
+
+_H5T_STD_B8LE = '\x03\x00\x14\x00\x00\x00\x01\x00\x00\x00\x00\x00\x08\x00'
+"""HDF5's encoded description of the 8-bit bitfield PyTables stores bools as"""
+
+class _H5pyFileInterface(_FileInterface):
+    """
+    Interface to a `h5py.File` object.
+
+    Produces the same layout as `_TablesFileInterface`, apart from the
+    PyTables-specific bookkeeping attributes, with less overhead per node.
+    Bools are stored as 8-bit bitfields, as PyTables does, instead of as
+    the enums h5py uses, which PyTables would read back as int8.
+    """
+    def __init__(self, file, type_map=None):
+        # accept also groups, paths are always absolute
+        _FileInterface.__init__(self, file.file, type_map)
+        import h5py
+        self._Dataset = h5py.Dataset
+        self._h5s, self._h5t, self._h5d = h5py.h5s, h5py.h5t, h5py.h5d
+        # h5py has no bitfield types of its own
+        self._bits_type = h5py.h5t.decode(_H5T_STD_B8LE)
+        # new groups track link creation order if the root group does,
+        # as in files opened with latest_format
+        self._track_order = bool(self.file['/'].id.get_create_plist()
+                                 .get_link_creation_order())
+
+    def open_file(cls, filename, mode, latest_format=False):
+        import h5py
+        if latest_format:
+            return h5py.File(filename, mode, libver='latest',
+                             track_order=True)
+        return h5py.File(filename, mode)
+    open_file = classmethod(open_file)
+
+    def set_attr(self, obj, attr, value):
+        if isinstance(value, str):
+            # store as fixed-length strings, as PyTables does
+            value = numpy.string_(value)
+        obj.attrs[attr] = value
+
+    def get_attr(self, obj, attr):
+        try:
+            value = obj.attrs[attr]
+        except KeyError:
+            raise AttributeError(attr)
+        if isinstance(value, numpy.string_):
+            value = str(value)
+        return value
+
+    def get_path(self, path):
+        try:
+            return self.file[path]
+        except KeyError:
+            raise NoSuchNodeError(path)
+
+    def has_path(self, path):
+        return path in self.file
+
+    def new_group(self, path):
+        if self._track_order:
+            return self.file.create_group(path, track_order=True)
+        return self.file.create_group(path)
+
+    def remove_path(self, path):
+        del self.file[path]
+
+    def save_numeric_array(self, path, data):
+        data = numpy.asarray(data)
+        if data.dtype.kind == 'b':
+            return self._save_bits(path, data)
+        return self.file.create_dataset(path, data=data)
+
+    def _save_bits(self, path, data):
+        """Save a bool array as a bitfield dataset."""
+        h5s = self._h5s
+        if data.shape == ():
+            space = h5s.create(h5s.SCALAR)
+        else:
+            space = h5s.create_simple(data.shape)
+        dataset = self._h5d.create(self.file.id, path, self._bits_type, space)
+        if data.size:
+            dataset.write(h5s.ALL, h5s.ALL,
+                          numpy.ascontiguousarray(data).view(numpy.uint8),
+                          mtype=self._h5t.NATIVE_UINT8)
+        return self.file[path]
+
+    def save_compressed_array(self, path, data):
+        if data.size == 0 or data.dtype.kind == 'b':
+            # bitfields are saved unfiltered, bools compress well anyway
+            return self.save_numeric_array(path, data)
+        return self.file.create_dataset(path, data=data, compression='gzip',
+                                        compression_opts=5, shuffle=True)
+
+    def save_extendable_array(self, path, data):
+        return self.file.create_dataset(path, data=data, maxshape=(None,),
+                                        chunks=True)
+
+    def append_array(self, node, data):
+        if len(data):
+            n = node.shape[0]
+            node.resize((n + len(data),))
+            node[n:] = data
+
+    def save_table(self, path, data):
+        return self.file.create_dataset(path, data=data)
+
+    def save_vlstrings(self, path, data):
+        # same as PyTables' VLStringAtom: variable-length uint8 sequences
+        import h5py
+        vldata = numpy.empty((len(data),), dtype=numpy.object_)
+        for i, item in enumerate(data):
+            vldata[i] = numpy.frombuffer(item, dtype=numpy.uint8)
+        array = self.file.create_dataset(
+            path, data=vldata, dtype=h5py.special_dtype(vlen=numpy.uint8))
+        self.set_attr(array, 'CLASS', 'VLARRAY')
+        self.set_attr(array, 'PSEUDOATOM', 'vlstring')
+        return array
+
+    def load_vlstrings(self, node):
+        return [item.tostring() for item in node[()]]
+
+    def get_pathname(self, node):
+        return node.name
+
+    def get_children(self, node):
+        # node names are always ASCII, h5py gives them as unicode
+        return [str(name) for name in node.keys()]
+
+    def is_array(self, node):
+        return isinstance(node, self._Dataset)
+
+    def read(self, node):
+        if self._is_bits(node):
+            return self._read_bits(node, 0, len(node) if node.shape else 0)
+        return numpy.asarray(node[()])
+
+    def read_slice(self, node, start, stop):
+        if self._is_bits(node):
+            start, stop = slice(start, stop).indices(node.shape[0])[:2]
+            return self._read_bits(node, start, max(stop - start, 0))
+        return node[start:stop]
+
+    def _is_bits(self, node):
+        return node.id.get_type().get_class() == self._h5t.BITFIELD
+
+    def _read_bits(self, node, start, count):
+        """
+        Read `count` rows from `start` on of a bitfield dataset, or all of
+        a scalar one, as bools.
+        """
+        h5s = self._h5s
+        shape = node.shape and (count,) + node.shape[1:]
+        data = numpy.empty(shape, dtype=numpy.uint8)
+        if data.size:
+            space = node.id.get_space()
+            if shape != node.shape:
+                space.select_hyperslab((start,) + (0,) * (len(shape) - 1),
+                                       shape)
+            node.id.read(h5s.create_simple(shape) if shape else h5s.ALL,
+                         space, data, mtype=self._h5t.NATIVE_UINT8)
+        return data.view(numpy.bool_)
+
+    def get_dtype(self, node):
+        if self._is_bits(node):
+            return numpy.dtype(numpy.bool_)
+        return node.dtype
+
+    def get_filename(self):
+        return self.file.filename
+
+    def get_offset(self, node):
+        if node.shape == () or node.chunks is not None:
+            return None
+        return node.id.get_offset()
+
+    def _read_into(self, node, out):
+        if self._is_bits(node):
+            out[...] = self.read(node)
+        else:
+            node.read_direct(out)
+
+
+_backends = {
+    'tables': _TablesFileInterface,
+    'h5py': _H5pyFileInterface,
+    }
+
+def _get_backend(backend):
+    if backend is None:
+        if tables is not None:
+            backend = 'tables'
+        else:
+            backend = 'h5py'
+    if isinstance(backend, basestring):
+        try:
+            return _backends[backend]
+        except KeyError:
+            raise ValueError("unknown backend %r" % backend)
+    return backend
+
+def _get_file_interface(file, type_map=None, backend=None):
+    """
+    Get a `_FileInterface` for `file`, either of the given backend, or
+    guessed from the type of `file`.
+    """
+    if backend is None:
+        if tables is not None and isinstance(file, tables.File):
+            backend = 'tables'
+        else:
+            backend = 'h5py'
+    return _get_backend(backend)(file, type_map)
+
 
 #############################################################################
 
@@ -234,12 +895,50 @@ class Pickler(object):
     You may wish to use a single instance of this class for multiple
     objects to preserve references. It should be safe to call the `dump`
     method multiple times, for different paths.
+
+    The HDF5 library used is chosen by `backend` ('tables' or 'h5py'),
+    or guessed from the type of `file` if not given.
+
+    If `string_pool` is True, strings, unicodes and non-name dict keys
+    are stored once in a pool shared by the whole file, and referred to
+    by index. New strings are appended to the pool at the end of each
+    `dump`.
+
+    If `bucket_size` is given, the items of lists and dicts longer than
+    it are spread over subgroups of about that many items, as HDF5 is
+    slow with very large groups.
+
+    If `class_table` is True, the classes and functions that instances
+    are created with are named once in a table shared by the whole file,
+    and instances refer to them by index.
+
+    If `pack_bools` is True, numpy bool arrays are packed eight elements
+    to a byte. Packed arrays cannot be memory-mapped on load.
     """
-    def __init__(self, file, type_map=None):
-        self.file = _FileInterface(file, type_map)
+    def __init__(self, file, type_map=None, backend=None,
+                 string_pool=False, bucket_size=None, class_table=False,
+                 pack_bools=False):
+        self.file = _get_file_interface(file, type_map, backend)
         
         self.paths = {}
         self.memo = {}
+        self.bucket_size = bucket_size
+        self.pack_bools = pack_bools
+
+        self.string_pool = string_pool
+        if string_pool:
+            self._pool = self._load_table(STRING_POOL_PATH)
+            self._pool_index = dict(itertools.izip(self._pool,
+                                                   itertools.count()))
+            self._pool_saved = len(self._pool)
+
+        self.class_table = class_table
+        if class_table:
+            self._classes = self._load_table(CLASS_TABLE_PATH)
+            self._class_index = dict(itertools.izip(self._classes,
+                                                    itertools.count()))
+            self._class_ids = {}
+            self._classes_saved = len(self._classes)
 
         self.proto = HDF5PICKLE_PROTOCOL # hard-coded
 
@@ -256,6 +955,74 @@ class Pickler(object):
 
     def dump(self, path, obj):
         self._save(path, obj)
+        if self.string_pool and len(self._pool) != self._pool_saved:
+            self._save_table(STRING_POOL_PATH, self._pool, self._pool_saved)
+            self._pool_saved = len(self._pool)
+        if self.class_table and len(self._classes) != self._classes_saved:
+            self._save_table(CLASS_TABLE_PATH, self._classes,
+                             self._classes_saved)
+            self._classes_saved = len(self._classes)
+
+    def _load_table(self, path):
+        """Load a per-file table of strings, or an empty list."""
+        if self.file.has_path(path):
+            return self.file.load_strings(self.file.get_path(path))
+        return []
+
+    def _save_table(self, path, items, start):
+        """
+        Write the items of a per-file table of strings from `start` on,
+        appending to the table in the file if it exists.
+        """
+        if self.file.has_path(path):
+            self.file.append_strings(self.file.get_path(path), items[start:])
+        else:
+            table = self.file.save_strings(path, items, extendable=True)
+            self.file.set_attr(table, 'pickletype', LIST)
+
+    def _pool_string(self, data):
+        """Return the index of the str `data` in the string pool."""
+        index = self._pool_index.get(data)
+        if index is None:
+            index = self._pool_index[data] = len(self._pool)
+            self._pool.append(data)
+        return index
+
+    def _class_id(self, obj):
+        """
+        Return the index of the class or function `obj` in the class
+        table, or None if it cannot be found by name.
+        """
+        index = self._class_ids.get(obj)
+        if index is None:
+            try:
+                name = '\n'.join(self._global_name(obj))
+            except PicklingError:
+                return None
+            index = self._class_index.get(name)
+            if index is None:
+                index = self._class_index[name] = len(self._classes)
+                self._classes.append(name)
+            self._class_ids[obj] = index
+        return index
+
+    def _save_class(self, path, group, name, obj):
+        """
+        Save the class or function `obj` as `path`/__/`name`, or with a
+        class table, as its index in the `name`_id attribute of `group`.
+        """
+        if self.class_table:
+            index = self._class_id(obj)
+            if index is not None:
+                self.file.set_attr(group, '%s_id' % name, index)
+                return
+        self._save_sub(path, name, obj)
+
+    def _save_sub(self, path, name, obj):
+        """Save `obj` as `path`/__/`name`, creating `path`/__ if needed."""
+        if not self.file.has_path('%s/__' % path):
+            self.file.new_group('%s/__' % path)
+        self._save('%s/__/%s' % (path, name), obj)
 
     def _save(self, path, obj):
         x = self.paths.get(id(obj))
@@ -270,6 +1037,8 @@ class Pickler(object):
         # Check if we have a dispatch for it
         t = type(obj)
         f = self._dispatch.get(t)
+        if f is None and not t in dispatch_table:
+            f = self._get_subclass_dispatch(t)
         if f:
             x = f(self, path, obj)
             return
@@ -320,6 +1089,27 @@ class Pickler(object):
 
     _dispatch = {}
 
+    _subclass_dispatch = {}
+
+    def _get_subclass_dispatch(self, t):
+        """
+        Find a dispatch for a subclass of a basic container type, if its
+        instances can be stored like the base type. The result is cached
+        per type.
+        """
+        try:
+            return self._subclass_dispatch[t]
+        except KeyError:
+            pass
+        except TypeError:
+            return None # unhashable type
+
+        f = None
+        if _container_base(t) is not None:
+            f = Pickler._save_container_subclass
+        self._subclass_dispatch[t] = f
+        return f
+
     def _save_ref(self, path, objpath):
         group = self.file.new_group(path)
         self.file.set_attr(group, 'target', objpath)
@@ -345,7 +1135,8 @@ class Pickler(object):
             raise PicklingError("func from reduce should be callable")
 
         group = self.file.new_group(path)
-        self.file.new_group(path + '/__')
+        if not self.class_table:
+            self.file.new_group(path + '/__')
 
         self.file.set_attr(group, 'pickletype', REDUCE)
 
@@ -386,28 +1177,34 @@ class Pickler(object):
                     "args[0] from __newobj__ args has the wrong class")
             args = args[1:]
 
-            self._save('%s/__/cls' % path, cls)
-            self._save('%s/__/args' % path, args)
+            self._save_class(path, group, 'cls', cls)
         else:
-            self._save('%s/__/func' % path, func)
-            self._save('%s/__/args' % path, args)
+            self._save_class(path, group, 'func', func)
+        if args != () or not self.class_table:
+            self._save_sub(path, 'args', args)
 
         if obj is not None:
             self._keep_alive(obj)
 
         if listitems is not None:
-            self._save('%s/__/listitems' % path, list(listitems))
+            self._save_sub(path, 'listitems', list(listitems))
 
         if dictitems is not None:
-            self._save('%s/__/dictitems' % path, dict(dictitems))
+            self._save_sub(path, 'dictitems', dict(dictitems))
 
         if state is not None:
             self.file.set_attr(group, 'has_reduce_content', 1)
             if isinstance(state, dict):
                 self._save_dict_content(path, state)
                 self._keep_alive(state)
+            elif (type(state) is TupleType and len(state) == 2
+                    and state[0] is None and type(state[1]) is DictType):
+                # __slots__ without __dict__: store the slots like a dict
+                self.file.set_attr(group, 'slots', 1)
+                self._save_dict_content(path, state[1])
+                self._keep_alive(state[1])
             else:
-                self._save('%s/__/content' % path, state)
+                self._save_sub(path, 'content', state)
 
     def _save_none(self, path, obj):
         array = self.file.save_array(path, 0)
@@ -425,7 +1222,11 @@ class Pickler(object):
     _dispatch[IntType] = _save_int
 
     def _save_long(self, path, obj):
-        array = self.file.save_array(path, str(encode_long(obj)))
+        try:
+            array = self.file.save_array(path, obj)
+        except TypeError:
+            # bignum
+            array = self.file.save_array(path, str(encode_long(obj)))
         self.file.set_attr(array, 'pickletype', LONG)
     _dispatch[LongType] = _save_long
 
@@ -440,56 +1241,336 @@ class Pickler(object):
     _dispatch[ComplexType] = _save_complex
 
     def _save_string(self, path, obj):
-        node = self.file.save_array(path, obj)
+        if self.string_pool:
+            node = self.file.save_numeric_array(path, numpy.array(
+                self._pool_string(obj), dtype=numpy.int64))
+        else:
+            node = self.file.save_array(path, obj)
         self.file.set_attr(node, 'pickletype', STRING)
     _dispatch[StringType] = _save_string
 
     def _save_unicode(self, path, obj):
-        node = self.file.save_array(path, obj.encode('utf-8'))
+        if self.string_pool:
+            node = self.file.save_numeric_array(path, numpy.array(
+                self._pool_string(obj.encode('utf-8')), dtype=numpy.int64))
+        else:
+            node = self.file.save_array(path, obj.encode('utf-8'))
         self.file.set_attr(node, 'pickletype', UNICODE)
     _dispatch[UnicodeType] = _save_unicode
 
     def _save_tuple(self, path, obj):
         try:
-            array = self.file.save_array(path, obj)
-            self.file.set_attr(array, 'pickletype', TUPLE)
-            return array
+            node = self._save_column(path, obj)
+            self.file.set_attr(node, 'pickletype', TUPLE)
+            return node
         except TypeError:
             pass
+        if len(obj) >= _INSTANCE_COLUMNS_MIN:
+            group = self._save_instance_columns(path, obj)
+            if group is not None:
+                self.file.set_attr(group, 'pickletype', TUPLE)
+                return group
 
         group = self.file.new_group(path)
         self.file.set_attr(group, 'pickletype', TUPLE)
+        self.file.set_attr(group, 'length', len(obj))
+        size = self.bucket_size
+        if size and len(obj) > size:
+            self.file.set_attr(group, 'bucket_size', size)
+            for i, item in enumerate(obj):
+                if i % size == 0:
+                    self.file.new_group('%s/_b%d' % (path, i // size))
+                self._save('%s/_b%d/_%d' % (path, i // size, i), item)
+            return group
         for i, item in enumerate(obj):
             self._save('%s/_%d' % (path, i), item)
         return group
     _dispatch[TupleType] = _save_tuple
 
+    def _save_instance_columns(self, path, obj):
+        """
+        Save a list of instances of one class, whose state is a
+        `__dict__` of scalars or arrays, as one array per attribute.
+        Items that do not fit are saved separately, as in a plain list.
+
+        :return: the group, or None if the list is not suitable
+        """
+        first = obj[0]
+        cls = getattr(first, '__class__', None)
+        if type(first) is InstanceType:
+            if (hasattr(first, '__getinitargs__')
+                    or hasattr(first, '__getstate__')):
+                return None
+        elif (type(first) is not cls or cls in self._dispatch
+                or cls in dispatch_table
+                or self._get_subclass_dispatch(cls) is not None):
+            return None
+        else:
+            try:
+                rv = first.__reduce_ex__(2)
+            except Exception:
+                return None
+            if (getattr(rv[0], '__name__', '') != '__newobj__'
+                    or rv[1] != (cls,)
+                    or rv[2] is not getattr(first, '__dict__', None)
+                    or [x for x in rv[3:] if x is not None]):
+                return None
+
+        state = first.__dict__
+        keys = sorted(state)
+        for key in keys:
+            if not (isinstance(key, str) and _check_pytables_name(key)
+                    and key != "__"):
+                return None
+        types = map(type, map(state.__getitem__, keys))
+        for t in types:
+            if not t in _INSTANCE_COLUMN_TYPES:
+                return None
+
+        keyset = set(keys)
+        rows = []
+        seen = set()
+        for i, item in enumerate(obj):
+            if (type(item) is type(first) and item.__class__ is cls
+                    and not id(item) in self.paths
+                    and not id(item) in seen):
+                state = item.__dict__
+                if (state.viewkeys() == keyset and
+                        map(type, map(state.__getitem__, keys)) == types):
+                    rows.append(i)
+                    seen.add(id(item))
+        if len(rows) < _INSTANCE_COLUMNS_MIN:
+            return None
+
+        group = self.file.new_group(path)
+        self.file.new_group('%s/__' % path)
+        self.file.new_group('%s/__/attrs' % path)
+        registered = []
+        try:
+            for key in keys:
+                # arrays are referred to as attributes of the items
+                self._save_column('%s/__/attrs/%s' % (path, key),
+                                  [obj[i].__dict__[key] for i in rows],
+                                  ['%s/_%d/%s' % (path, i, key) for i in rows],
+                                  registered)
+        except TypeError:
+            for item_id in registered:
+                del self.paths[item_id]
+            self.file.remove_path(path)
+            return None
+        self.file.set_attr(group, 'instances', 1)
+        self.file.set_attr(group, 'length', len(obj))
+        self._save_class(path, group, 'cls', cls)
+        if len(rows) < len(obj):
+            self.file.save_numeric_array('%s/__/rows' % path,
+                                         numpy.array(rows, dtype=numpy.int64))
+
+        # the items have no nodes of their own, but can be referred to
+        for i in rows:
+            self.paths[id(obj[i])] = '%s/_%d' % (path, i)
+            self._keep_alive(obj[i])
+        rows = set(rows)
+        for i, item in enumerate(obj):
+            if not i in rows:
+                self._save('%s/_%d' % (path, i), item)
+        return group
+
     def _save_list(self, path, obj):
         item = self._save_tuple(path, obj)
         self.file.set_attr(item, 'pickletype', LIST)
     _dispatch[ListType] = _save_list
 
+    def _save_set(self, path, obj):
+        items = list(obj)
+        try:
+            items.sort()
+        except TypeError:
+            pass # unorderable items, eg. complex numbers
+        node = self._save_tuple(path, items)
+        if isinstance(obj, frozenset):
+            self.file.set_attr(node, 'pickletype', FROZENSET)
+        else:
+            self.file.set_attr(node, 'pickletype', SET)
+    _dispatch[set] = _save_set
+    _dispatch[frozenset] = _save_set
+
+    def _save_container_subclass(self, path, obj):
+        cls = type(obj)
+        base = _container_base(cls)
+        group = self.file.new_group(path)
+        self.file.set_attr(group, 'pickletype', SUBCLASS)
+        self.file.new_group('%s/__' % path)
+        self._save_class(path, group, 'cls', cls)
+
+        reduce_ = _container_reduce.get(base)
+        if reduce_ is not None:
+            # standard library containers with their own __reduce__
+            args, state, keep_order = reduce_(obj)
+            self.file.set_attr(group, 'call_cls', 1)
+            if args:
+                self._save('%s/__/args' % path, args)
+        else:
+            getstate = getattr(obj, '__getstate__', None)
+            if getstate is not None:
+                state = getstate()
+            else:
+                state = getattr(obj, '__dict__', None)
+            keep_order = False
+
+        if issubclass(base, dict):
+            self._save('%s/__/base' % path, dict(obj))
+            if keep_order:
+                self._save('%s/__/keys' % path, obj.keys())
+        else:
+            self._save('%s/__/base' % path, base(obj))
+
+        if state:
+            self.file.set_attr(group, 'has_reduce_content', 1)
+            if isinstance(state, dict):
+                self._save_dict_content(path, state)
+                self._keep_alive(state)
+            else:
+                self._save('%s/__/content' % path, state)
+
     def _save_dict(self, path, obj):
         group = self.file.new_group(path)
         self.file.set_attr(group, 'pickletype', DICT)
+        if obj and self._save_dict_columns(path, obj):
+            self.file.set_attr(group, 'columns', 1)
+            return
+        if self.bucket_size and len(obj) > self.bucket_size:
+            self._save_dict_buckets(path, obj)
+            return
         self._save_dict_content(path, obj)
 
+    def _save_dict_buckets(self, path, obj):
+        """
+        Save the entries of a large dict in subgroups, each laid out as
+        a dict. The subgroup of a key is chosen by its `_key_hash`.
+        """
+        n = -(-len(obj) // self.bucket_size)
+        buckets = [{} for i in xrange(n)]
+        for key, value in obj.iteritems():
+            buckets[_key_bucket(key, n)][key] = value
+        self.file.set_attr(self.file.get_path(path), 'buckets', n)
+        for i, bucket in enumerate(buckets):
+            self.file.new_group('%s/_b%d' % (path, i))
+            self._save_dict_content('%s/_b%d' % (path, i), bucket)
+
+    def _save_dict_columns(self, path, obj):
+        """
+        Save a dict with keys that are not all valid names as an array
+        of keys and an array of values, if both can be packed.
+
+        :return: True if saved, False if the dict must be saved per entry
+        """
+        keys = obj.keys()
+        if type(keys[0]) is str:
+            for key in keys:
+                if not (isinstance(key, str) and _check_pytables_name(key)
+                        and key != "__"):
+                    break
+            else:
+                return False
+        values = obj.values()
+        order = None
+        if len(keys) >= _KEY_INDEX_MIN and type(keys[0]) in (int, long, float):
+            # numbers are sorted for looking up single keys by bisection
+            array = numpy.array(keys)
+            if array.dtype.kind in 'iuf':
+                order = array.argsort(kind='mergesort').tolist()
+                keys = map(keys.__getitem__, order)
+                values = map(values.__getitem__, order)
+
+        self.file.new_group('%s/__' % path)
+        registered = []
+        try:
+            node = self._save_column('%s/__/keys' % path, keys,
+                                     registered=registered)
+            self._save_column('%s/__/values' % path, values,
+                              registered=registered)
+        except TypeError:
+            # the items are saved per entry instead
+            for item_id in registered:
+                del self.paths[item_id]
+            self.file.remove_path('%s/__' % path)
+            return False
+        if order is not None:
+            self.file.set_attr(node, 'sorted', 1)
+        elif len(keys) >= _KEY_INDEX_MIN:
+            self._save_key_index('%s/__/index' % path,
+                                 [(key, '_%d' % i)
+                                  for i, key in enumerate(keys)])
+        return True
+
+    def _save_column(self, path, items, item_paths=None, registered=None):
+        """
+        Save a sequence as a single array, or as packed strings, if its
+        items allow. See `_save_nested` for `item_paths` and `registered`.
+
+        :raise TypeError: if the items cannot be packed
+        """
+        if items and type(items[0]) in (list, tuple, numpy.ndarray):
+            return self._save_nested(path, items, item_paths, registered)
+        try:
+            return self.file.save_array(path, items)
+        except TypeError:
+            return self.file.save_strings(path, items)
+
+    def _save_nested(self, path, data, item_paths=None, registered=None):
+        """
+        Save a rectangular nested sequence of numbers, or a sequence of
+        equal-shape arrays, as a single N-d array. The kinds of the inner
+        sequences are recorded in the 'nested' attribute.
+
+        The inner sequences and arrays get no nodes of their own, so this
+        is refused if any of them was saved before. They are registered
+        under `item_paths` (``path/_i`` by default), and their items
+        under ``item_path/_j`` and so on, for later references to them.
+        The registered ids are appended to `registered`, if given.
+
+        :raise TypeError: if the items cannot be packed
+        """
+        array, kinds, levels = self.file.nested_array(data)
+        for level in levels:
+            for item in level:
+                if id(item) in self.paths:
+                    raise TypeError # keep references to items saved before
+        node = self.file.save_numeric_array(path, array)
+        self.file.set_attr(node, 'nested', kinds)
+
+        if item_paths is None:
+            item_paths = ['%s/_%d' % (path, i) for i in xrange(len(data))]
+        for k, level in enumerate(levels):
+            if k:
+                n = len(levels[k - 1][0])
+                item_paths = ['%s/_%d' % (item_path, j)
+                              for item_path in item_paths for j in xrange(n)]
+            for item, item_path in itertools.izip(level, item_paths):
+                self.paths[id(item)] = item_path
+                self._keep_alive(item)
+            if registered is not None:
+                registered.extend(itertools.imap(id, level))
+        return node
+
     def _save_dict_content(self, path, obj):
         strkeys = {}
-        seen = {}
-        keyi = 0
+        others = []
         for key in obj.iterkeys():
             if (isinstance(key, str) and _check_pytables_name(key)
                     and key != "__"):
                 strkeys[key] = key
-                seen[key] = True
-        for key in obj.iterkeys():
-            if not key in strkeys:
-                while ("_%d" % keyi) in seen: keyi += 1
-                strkeys[key] = "_%d" % keyi
-                seen[strkeys[key]] = True
+            else:
+                others.append(key)
+        keyi = 0
+        for key in others:
+            # surrogates must not clash with the keys used as names
+            while ("_%d" % keyi) in strkeys: keyi += 1
+            strkeys[key] = "_%d" % keyi
+            keyi += 1
 
         hassub = self.file.has_path('%s/__' % path)
+        pooled = []
 
         for key, value in obj.iteritems():
             self._save('/'.join([path, strkeys[key]]), value)
@@ -497,7 +1578,40 @@ class Pickler(object):
                 if not hassub:
                     self.file.new_group('%s/__' % path)
                     hassub = True
-                self._save('%s/__/%s' % (path, strkeys[key]), key)
+                if self.string_pool and type(key) is str:
+                    pooled.append((int(strkeys[key][1:]),
+                                   self._pool_string(key), 0))
+                elif self.string_pool and type(key) is unicode:
+                    pooled.append((int(strkeys[key][1:]),
+                                   self._pool_string(key.encode('utf-8')), 1))
+                else:
+                    self._save('%s/__/%s' % (path, strkeys[key]), key)
+
+        if pooled:
+            # surrogate number, pool index, is unicode
+            self.file.save_numeric_array('%s/__/pool' % path,
+                numpy.array(pooled, dtype=numpy.int64))
+
+        surrogates = [(key, name) for key, name in strkeys.iteritems()
+                      if not name is key]
+        if len(surrogates) >= _KEY_INDEX_MIN:
+            self._save_key_index('%s/__/index' % path, surrogates)
+
+    def _save_key_index(self, path, surrogates):
+        """
+        Save the (hash, surrogate number) pairs of the keys, sorted by a
+        stable hash, for looking up single keys with `load_item`. For
+        dicts saved as columns, the rows of the keys are given as `_N`.
+        """
+        hashes = map(_key_hash, [key for key, name in surrogates])
+        if None in hashes:
+            return # key not hashable this way
+        hashes = numpy.array(hashes, dtype=numpy.int64)
+        numbers = numpy.array([int(name[1:]) for key, name in surrogates],
+                              dtype=numpy.int64)
+        order = numpy.lexsort((numbers, hashes))
+        self.file.save_numeric_array(
+            path, numpy.column_stack((hashes[order], numbers[order])))
 
     _dispatch[DictionaryType] = _save_dict
     if not PyStringMap is None:
@@ -522,18 +1636,23 @@ class Pickler(object):
         group = self.file.new_group(path)
         self.file.set_attr(group, 'pickletype', INST)
 
-        self.file.new_group("%s/__" % path)
-        self._save('%s/__/cls' % path, cls)
-        self._save('%s/__/args' % path, args)
+        if not self.class_table:
+            self.file.new_group("%s/__" % path)
+        self._save_class(path, group, 'cls', cls)
+        if args != () or not self.class_table:
+            self._save_sub(path, 'args', args)
 
         if isinstance(stuff, dict):
             self._save_dict_content(path, stuff)
             self._keep_alive(stuff)
         else:
-            self._save('%s/__/content' % path, stuff)
+            self._save_sub(path, 'content', stuff)
     _dispatch[InstanceType] = _save_inst
 
-    def _save_global(self, path, obj, name=None, pack=struct.pack):
+    def _global_name(self, obj, name=None):
+        """
+        Return the module and name under which `obj` can be found.
+        """
         if name is None:
             name = obj.__name__
 
@@ -554,6 +1673,10 @@ class Pickler(object):
                 raise PicklingError(
                     "Can't pickle %r: it's not the same object as %s.%s" %
                     (obj, module, name))
+        return module, name
+
+    def _save_global(self, path, obj, name=None, pack=struct.pack):
+        module, name = self._global_name(obj, name)
 
         pickletype = None
 
@@ -586,11 +1709,57 @@ class Pickler(object):
     def _save_numpy_array(self, path, obj):
         if not NumpyArrayType_native:
             obj = numpy.asarray(obj)
+        kind = obj.dtype.kind
+        if kind == 'O' and obj.dtype.names is None:
+            return self._save_numpy_object(path, obj)
+        elif obj.dtype.hasobject:
+            # object fields in records: no native representation
+            return self._save_reduce(path, obj=obj, *obj.__reduce_ex__(2))
+        elif obj.dtype.names is not None:
+            return self._save_numpy_record(path, obj)
+        elif kind in 'Mm':
+            return self._save_numpy_datetime(path, obj)
+        elif kind == 'b' and self.pack_bools and obj.size >= 8:
+            return self._save_numpy_bits(path, obj)
         array = self.file.save_numeric_array(path, obj)
         self.file.set_attr(array, 'pickletype', NUMPY)
         return array
     _dispatch[NumpyArrayType] = _save_numpy_array
 
+    def _save_numpy_record(self, path, obj):
+        table = self.file.save_table(path, obj.ravel())
+        self.file.set_attr(table, 'pickletype', NUMPY_RECORD)
+        self.file.set_attr(table, 'shape', _shape_to_str(obj.shape))
+        return table
+
+    def _save_numpy_datetime(self, path, obj):
+        obj = obj.astype(obj.dtype.newbyteorder('='), copy=False)
+        array = self.file.save_numeric_array(path, obj.view(numpy.int64))
+        self.file.set_attr(array, 'pickletype', NUMPY_DATETIME)
+        self.file.set_attr(array, 'dtype', obj.dtype.str)
+        return array
+
+    def _save_numpy_bits(self, path, obj):
+        array = self.file.save_bits(path, obj)
+        self.file.set_attr(array, 'pickletype', NUMPY_BITS)
+        self.file.set_attr(array, 'shape', _shape_to_str(obj.shape))
+        return array
+
+    def _save_numpy_object(self, path, obj):
+        items = obj.ravel().tolist()
+        types = set(map(type, items))
+        if types == set([str]) or types == set([unicode]):
+            if types == set([unicode]):
+                items = [item.encode('utf-8') for item in items]
+            node = self.file.save_vlstrings(path, items)
+            self.file.set_attr(node, 'strtype', types.pop().__name__)
+        else:
+            # heterogeneous: pickle each element, packing where possible
+            node = self._save_tuple(path, items)
+        self.file.set_attr(node, 'pickletype', NUMPY_OBJECT)
+        self.file.set_attr(node, 'shape', _shape_to_str(obj.shape))
+        return node
+
     def _save_numarray_array(self, path, obj):
         if not NumarrayArrayType_native:
             obj = numpy.asarray(obj)
@@ -599,6 +1768,32 @@ class Pickler(object):
         return array
     _dispatch[NumarrayArrayType] = _save_numarray_array
 
+    def _save_sparse_matrix(self, path, obj):
+        group = self.file.new_group(path)
+        self.file.set_attr(group, 'pickletype', SPARSE)
+        self.file.set_attr(group, 'format', obj.format)
+        self.file.set_attr(group, 'shape', _shape_to_str(obj.shape))
+        if obj.format == 'coo':
+            names = ('data', 'row', 'col')
+        else:
+            names = ('data', 'indices', 'indptr')
+        for name in names:
+            self.file.save_compressed_array('%s/%s' % (path, name),
+                                            getattr(obj, name))
+        return group
+    for _t in SparseMatrixTypes:
+        _dispatch[_t] = _save_sparse_matrix
+
+    def _save_numpy_scalar(self, path, obj):
+        array = self.file.save_numeric_array(path, numpy.asarray(obj))
+        self.file.set_attr(array, 'pickletype', NUMPY_SCALAR)
+        return array
+    for _t in set(numpy.sctypeDict.values()):
+        if not issubclass(_t, (numpy.flexible, numpy.object_,
+                               numpy.datetime64, numpy.timedelta64)):
+            _dispatch[_t] = _save_numpy_scalar
+    del _t
+
 
 #############################################################################
 
@@ -641,34 +1836,333 @@ class Unpickler(object):
     You may wish to use a single instance of this class for multiple
     objects to preserve references. It should be safe to call the `load`
     method multiple times, for different paths.
+
+    Numpy arrays are read into the preallocated arrays in `out`, a mapping
+    of paths to arrays, if present there, and memory-mapped if `mmap` is
+    true.
+
+    The HDF5 library used is chosen by `backend` ('tables' or 'h5py'),
+    or guessed from the type of `file` if not given.
     """
-    def __init__(self, file, type_map=None):
-        self.file = _FileInterface(file, type_map=None)
+    def __init__(self, file, type_map=None, mmap=False, out=None,
+                 backend=None):
+        self.file = _get_file_interface(file, None, backend)
         self.memo = {}
+        self.mmap = mmap
+        self._pool = None
+        self._classes = None
+        self._class_cache = {}
+        self._depth = 0
+        if out is None:
+            self.out = {}
+        else:
+            self.out = dict(out)
 
     def clear_memo(self):
         self.memo = {}
 
-    def load(self, path):
+    def load(self, path, target=None):
+        if target is not None:
+            self._collect_arrays(path, target, {})
         if not path in self.memo:
+            self._depth += 1
+            try:
+                try:
+                    node = self.file.get_path(path)
+                except NoSuchNodeError:
+                    return self._load_virtual(path)
+                try:
+                    key = self.file.get_attr(node, 'pickletype')
+                except AttributeError:
+                    key = None
+                if key:
+                    f = self._dispatch[key]
+                    obj = f(self, node)
+                else:
+                    obj = self._load_raw(node)
+                self.memo[path] = obj
+            finally:
+                self._depth -= 1
+                if not self._depth:
+                    self.file.release()
+        return self.memo[path]
+
+    def _collect_arrays(self, path, obj, seen):
+        """
+        Map the paths of the numpy arrays contained in `obj`, a previously
+        loaded object, in `self.out`, following the layout of the object
+        saved at `path`. `seen` keeps the objects visited.
+        """
+        node = None # packed items have no nodes of their own
+        while self.file.has_path(path):
             node = self.file.get_path(path)
+            if (not self.file.has_attr(node, 'pickletype')
+                    or self.file.get_attr(node, 'pickletype') != REF):
+                break
+            path = self.file.get_attr(node, 'target')
+            node = None
+        if id(obj) in seen:
+            return
+        seen[id(obj)] = obj # keep alive, as bases are made here
+
+        if isinstance(obj, numpy.ndarray):
+            self.out.setdefault(path, obj)
+        elif type(obj) in (list, tuple):
+            if node is not None and self.file.has_attr(node, 'bucket_size'):
+                size = self.file.get_attr(node, 'bucket_size')
+                paths = ['%s/_b%d/_%d' % (path, i // size, i)
+                         for i in xrange(len(obj))]
+            else:
+                paths = ['%s/_%d' % (path, i) for i in xrange(len(obj))]
+            for item_path, item in itertools.izip(paths, obj):
+                self._collect_arrays(item_path, item, seen)
+        elif type(obj) is dict:
+            if node is not None:
+                self._collect_dict_arrays(path, node, obj, seen)
+        elif node is None:
+            # instances stored as columns
+            state = getattr(obj, '__dict__', None)
+            if isinstance(state, dict):
+                for key, value in state.iteritems():
+                    if (isinstance(key, str) and _check_pytables_name(key)
+                            and key != "__"):
+                        self._collect_arrays('%s/%s' % (path, key), value,
+                                             seen)
+        elif not self.file.is_array(node):
+            if (self.file.has_attr(node, 'pickletype')
+                    and self.file.get_attr(node, 'pickletype') == SUBCLASS):
+                base = _container_base(type(obj))
+                if issubclass(base, dict):
+                    base = dict
+                self._collect_arrays('%s/__/base' % path, base(obj), seen)
+            if (not self.file.has_attr(node, 'has_reduce_content')
+                    or self.file.has_path('%s/__/content' % path)):
+                return
+            if self.file.has_attr(node, 'slots'):
+                state = dict((name, getattr(obj, name))
+                             for name in _slotnames(type(obj))
+                             if hasattr(obj, name))
+            else:
+                state = getattr(obj, '__dict__', None)
+            if isinstance(state, dict):
+                self._collect_entry_arrays(path, state, seen)
+
+    def _collect_dict_arrays(self, path, node, obj, seen):
+        if self.file.has_attr(node, 'columns'):
+            keys = self._load_column(self.file.get_path('%s/__/keys' % path))
+            rows = dict(itertools.izip(keys, itertools.count()))
+            for key, value in obj.iteritems():
+                i = rows.get(key)
+                if i is not None:
+                    self._collect_arrays('%s/__/values/_%d' % (path, i),
+                                         value, seen)
+        elif self.file.has_attr(node, 'buckets'):
+            n = self.file.get_attr(node, 'buckets')
+            buckets = {}
+            for key, value in obj.iteritems():
+                buckets.setdefault(_key_bucket(key, n), {})[key] = value
+            for i, bucket in buckets.iteritems():
+                self._collect_entry_arrays('%s/_b%d' % (path, i), bucket,
+                                           seen)
+        else:
+            self._collect_entry_arrays(path, obj, seen)
+
+    def _collect_entry_arrays(self, path, obj, seen):
+        """`_collect_arrays` for entries saved by `_save_dict_content`."""
+        names = None
+        for key, value in obj.iteritems():
+            if (isinstance(key, str) and _check_pytables_name(key)
+                    and key != "__"):
+                name = key
+            else:
+                if names is None:
+                    names = dict((key, name) for name, key
+                                 in self._load_surrogate_keys(path))
+                name = names.get(key)
+                if name is None:
+                    continue
+            self._collect_arrays('%s/%s' % (path, name), value, seen)
+
+    def _load_virtual(self, path):
+        """
+        Load an item packed into a nested array, or into the columns of
+        a list of instances, which has no node of its own, by loading
+        the object holding it. Other missing paths raise NoSuchNodeError
+        without loading anything.
+        """
+        parent = path
+        while True:
+            parent = parent[:parent.rindex('/')]
+            if not parent:
+                raise NoSuchNodeError(path)
+            if self.file.has_path(parent):
+                break
+        node = self.file.get_path(parent)
+        if not (self.file.has_attr(node, 'nested')
+                or self.file.has_attr(node, 'instances')):
+            raise NoSuchNodeError(path)
+        # columns of dicts are loaded with the dict
+        while not self.file.has_attr(node, 'pickletype'):
+            parent = parent[:parent.rindex('/')]
+            if not parent:
+                raise NoSuchNodeError(path)
+            node = self.file.get_path(parent)
+        self.load(parent)
+        if path in self.memo:
+            return self.memo[path]
+        raise NoSuchNodeError(path)
+
+    def load_item(self, path, key):
+        """
+        Load the value for `key` of the dict saved at `path`, without
+        loading the other values.
+        """
+        node = self.file.get_path(path)
+        if (not self.file.has_attr(node, 'pickletype')
+                or self.file.get_attr(node, 'pickletype') != DICT):
+            return self.load(path)[key]
+        if self.file.has_attr(node, 'columns'):
+            i = self._find_column_key(path, key)
+            return self._load_column_item(
+                self.file.get_path('%s/__/values' % path), i,
+                '%s/__/values/_%d' % (path, i))
+        if self.file.has_attr(node, 'buckets'):
+            n = self.file.get_attr(node, 'buckets')
+            path = '%s/_b%d' % (path, _key_bucket(key, n))
+        name = key
+        if type(key) is unicode:
+            # u'a' == 'a', and may have been saved under the name
             try:
-                key = self.file.get_attr(node, 'pickletype')
-            except AttributeError:
-                key = None
-            if key:
-                f = self._dispatch[key]
-                obj = f(self, node)
+                name = key.encode('ascii')
+            except UnicodeError:
+                pass
+        if (isinstance(name, str) and _check_pytables_name(name)
+                and name != "__" and not self._is_surrogate(path, name)):
+            try:
+                return self.load('%s/%s' % (path, name))
+            except NoSuchNodeError:
+                pass # eg. 'a' saved as u'a', under a surrogate
+
+        names = None
+        if self.file.has_path('%s/__/index' % path):
+            h = _key_hash(key)
+            if h is not None:
+                index = self.file.get_path('%s/__/index' % path)
+                names = ['_%d' % i for i in self._find_key_hash(index, h)]
+        for name, candidate in self._load_surrogate_keys(path, names):
+            if candidate == key:
+                return self.load('%s/%s' % (path, name))
+        raise KeyError(key)
+
+    def _find_column_key(self, path, key):
+        """
+        Row of `key` in the keys array of the dict saved as columns at
+        `path`, found through the key index if there is one.
+        """
+        node = self.file.get_path('%s/__/keys' % path)
+        if self.file.has_attr(node, 'sorted'):
+            if type(key) is complex and not key.imag:
+                key = key.real
+            if not type(key) in (int, long, float, bool):
+                raise KeyError(key)
+            lo, hi = 0, int(node.shape[0])
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self.file.read_slice(node, mid, mid + 1)[0] < key:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            if (lo == int(node.shape[0])
+                    or self.file.read_slice(node, lo, lo + 1)[0] != key):
+                raise KeyError(key)
+            return lo
+        h = _key_hash(key)
+        if h is not None and self.file.has_path('%s/__/index' % path):
+            index = self.file.get_path('%s/__/index' % path)
+            for i in self._find_key_hash(index, h):
+                if self._load_column_item(
+                        node, i, '%s/__/keys/_%d' % (path, i)) == key:
+                    return i
+            raise KeyError(key)
+        if (self.file.is_array(node) and type(key) in (int, long, float)
+                and not self.file.has_attr(node, 'nested')
+                and not self.file.has_attr(node, 'packed')):
+            rows = numpy.flatnonzero(
+                numpy.asarray(self.file.read(node)) == key)
+        else:
+            rows = [i for i, item in enumerate(self._load_column(node))
+                    if item == key][:1]
+        if not len(rows):
+            raise KeyError(key)
+        return int(rows[0])
+
+    def _is_surrogate(self, path, name):
+        """
+        Whether `name` in the dict group at `path` stands for a key that
+        is not a name.
+        """
+        if not re.match(r'_\d+$', name):
+            return False
+        if self.file.has_path('%s/__/%s' % (path, name)):
+            return True
+        if self.file.has_path('%s/__/pool' % path):
+            rows = self.file.read(self.file.get_path('%s/__/pool' % path))
+            return int(name[1:]) in rows[:, 0]
+        return False
+
+    def _load_surrogate_keys(self, path, names=None):
+        """
+        Load (surrogate, key) pairs of the dict at `path`, for the given
+        surrogate names or all of them.
+        """
+        if not self.file.has_path('%s/__' % path):
+            return []
+        pooled = {}
+        if self.file.has_path('%s/__/pool' % path):
+            rows = self.file.read(self.file.get_path('%s/__/pool' % path))
+            for i, index, is_unicode in rows.tolist():
+                key = self._pooled_string(index)
+                if is_unicode:
+                    key = key.decode('utf-8')
+                pooled['_%d' % i] = key
+        if names is None:
+            names = [name for name in self.file.get_children(
+                         self.file.get_path('%s/__' % path))
+                     if name.startswith('_')] + pooled.keys()
+        items = []
+        for name in names:
+            if name in pooled:
+                items.append((name, pooled[name]))
             else:
-                obj = self._load_raw(node)
-            self.memo[path] = obj
-        return self.memo[path]
+                items.append((name, self.load('%s/__/%s' % (path, name))))
+        return items
+
+    def _find_key_hash(self, index, h):
+        """
+        Surrogate numbers, or rows, of the entries of a key index with
+        hash `h`.
+        """
+        lo, hi = 0, int(index.shape[0])
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.file.read_slice(index, mid, mid + 1)[0][0] < h:
+                lo = mid + 1
+            else:
+                hi = mid
+        found = []
+        while lo < int(index.shape[0]):
+            row = self.file.read_slice(index, lo, lo + 1)[0]
+            if row[0] != h:
+                break
+            found.append(int(row[1]))
+            lo += 1
+        return found
 
     _dispatch = {}
 
     def _load_raw(self, node):
-        if hasattr(node, 'read'):
-            return node.read()
+        if self.file.is_array(node):
+            return self.file.read(node)
         else:
             container = Container()
             self._load_dict_content(node, container)
@@ -680,11 +2174,12 @@ class Unpickler(object):
     _dispatch[REF] = _load_ref
 
     def _load_reduce(self, node):
-        path = node._v_pathname
-        args = self.load('%s/__/args' % path)
+        path = self.file.get_pathname(node)
+        args = self._load_args(path)
 
-        if self.file.has_path('%s/__/func' % path):
-            func = self.load('%s/__/func' % path)
+        if (self.file.has_attr(node, 'func_id')
+                or self.file.has_path('%s/__/func' % path)):
+            func = self._load_class(node, 'func')
             
             if args is None:
                 warnings.warn("__basicnew__ special case is deprecated",
@@ -693,7 +2188,7 @@ class Unpickler(object):
             else:
                 obj = func(*args)
         else:
-            cls = self.load('%s/__/cls' % path)
+            cls = self._load_class(node, 'cls')
             obj = cls.__new__(cls, *args)
 
         self.memo[path] = obj
@@ -711,6 +2206,13 @@ class Unpickler(object):
             state = self.load('%s/__/content' % path)
             if state is not None:
                 self._setstate(obj, state)
+        elif self.file.has_attr(node, 'slots'):
+            state = self._load_dict_content(node, {})
+            if hasattr(obj, '__setstate__'):
+                obj.__setstate__((None, state))
+            else:
+                for k, v in state.iteritems():
+                    setattr(obj, k, v)
         elif self.file.has_attr(node, 'has_reduce_content'):
             state = {}
             state = self._load_dict_content(node, state)
@@ -731,6 +2233,8 @@ class Unpickler(object):
     _dispatch[INT] = _load_int
 
     def _load_long(self, node):
+        if tuple(node.shape) == ():
+            return self.file.load_array(node, long)
         data = self.file.load_array(node, str)
         return decode_long(data)
     _dispatch[LONG] = _load_long
@@ -743,36 +2247,203 @@ class Unpickler(object):
         return self.file.load_array(node, complex)
     _dispatch[COMPLEX] = _load_complex
 
+    def _pooled_string(self, index):
+        if self._pool is None:
+            self._pool = self.file.load_strings(
+                self.file.get_path(STRING_POOL_PATH))
+        return self._pool[index]
+
     def _load_string(self, node):
+        if tuple(node.shape) == ():
+            return self._pooled_string(int(self.file.read(node)))
         return self.file.load_array(node, str)
     _dispatch[STRING] = _load_string
 
     def _load_unicode(self, node):
-        data = self.file.load_array(node, str)
-        return data.decode('utf-8')
+        if tuple(node.shape) == ():
+            index = int(self.file.read(node))
+            return self._pooled_string(index).decode('utf-8')
+        return unicode(self.file.load_buffer(node), 'utf-8')
     _dispatch[UNICODE] = _load_unicode
 
     def _load_list_content(self, node):
-        if isinstance(node, tables.Array):
-            return self.file.load_array(node, list)
+        if self.file.is_array(node) or self.file.has_attr(node, 'packed'):
+            return self._load_column(node)
+        elif self.file.has_attr(node, 'instances'):
+            return self._load_instance_columns(node)
 
+        path = self.file.get_pathname(node)
         items = []
-        self.memo[node._v_pathname] = items # avoid infinite loop
-
-        def cmpfunc(a, b):
-            c = len(a) - len(b)
-            if c == 0:
-                c = cmp(a, b)
-            return c
-
-        names = list(node._v_children)
-        names.sort(cmpfunc)
+        self.memo[path] = items # avoid infinite loop
+
+        if self.file.has_attr(node, 'bucket_size'):
+            size = self.file.get_attr(node, 'bucket_size')
+            names = ['_b%d/_%d' % (i // size, i)
+                     for i in xrange(self.file.get_attr(node, 'length'))]
+        elif self.file.has_attr(node, 'length'):
+            names = ['_%d' % i
+                     for i in xrange(self.file.get_attr(node, 'length'))]
+        else:
+            # written by older versions: order _0, _1, ..., _10, ...
+            names = self.file.get_children(node)
+            names.sort(key=lambda name: (len(name), name))
 
         for name in names:
-            items.append(self.load('%s/%s' % (node._v_pathname, name)))
+            items.append(self.load('%s/%s' % (path, name)))
         
         return items
     
+    def _load_column(self, node, paths=None):
+        """
+        Load a sequence saved by `Pickler._save_column`. The items of a
+        nested array are memoized under `paths` (``path/_i`` by default),
+        as they were registered when saving.
+        """
+        if not self.file.is_array(node):
+            return self.file.load_strings(node)
+        if not self.file.has_attr(node, 'nested'):
+            return self.file.load_array(node, list)
+        kinds = self.file.get_attr(node, 'nested')
+        n = int(node.shape[0])
+        if paths is None:
+            path = self.file.get_pathname(node)
+            paths = ['%s/_%d' % (path, i) for i in xrange(n)]
+        data = None
+        wanted = ()
+        if 'a' in kinds:
+            if self.mmap:
+                data = self.file.map_array(node)
+            if data is None:
+                wanted = self._out_rows(paths)
+        if data is None and not wanted:
+            data = numpy.asarray(self.file.read(node))
+        if data is not None:
+            return self._load_nested(data, kinds, paths)
+
+        # rows with out buffers are read one at a time, so that they are
+        # not held in memory twice
+        items = []
+        start = 0
+        for i in sorted(wanted) + [n]:
+            for a, b in ((start, i), (i, min(i + 1, n))):
+                if a < b:
+                    rows = numpy.asarray(self.file.read_slice(node, a, b))
+                    items.extend(self._load_nested(rows, kinds, paths[a:b]))
+            start = i + 1
+        return items
+
+    def _out_rows(self, paths):
+        """
+        Indices of the `paths` that have buffers in `out` for them, or for
+        items in them.
+        """
+        index = dict(itertools.izip(paths, itertools.count()))
+        rows = set()
+        for path in self.out:
+            while path:
+                i = index.get(path)
+                if i is not None:
+                    rows.add(i)
+                    break
+                path = path[:max(path.rfind('/'), 0)]
+        return rows
+
+    def _load_column_item(self, node, i, path):
+        """
+        Load item `i` of a sequence saved by `Pickler._save_column`,
+        reading only its row. An item of a nested array is memoized under
+        `path`.
+        """
+        if not self.file.is_array(node):
+            return self.file.load_strings_item(node, i)
+        if self.file.has_attr(node, 'packed'):
+            return self.file.load_bits_item(node, i)
+        rows = numpy.asarray(self.file.read_slice(node, i, i + 1))
+        if self.file.has_attr(node, 'nested'):
+            return self._load_nested(rows, self.file.get_attr(node, 'nested'),
+                                     [path])[0]
+        if self.file.has_attr(node, 'long'):
+            return long(rows[0])
+        return rows.tolist()[0]
+
+    def _load_nested(self, data, kinds, paths):
+        """
+        Convert the rows of an array saved by `Pickler._save_nested` back
+        to lists, tuples or arrays, memoized under `paths`.
+        """
+        kind = kinds[0]
+        if kind == 'a':
+            items = map(self._fill_out, paths, data)
+        elif len(kinds) == 1:
+            items = data.tolist()
+            if kind == 't':
+                items = map(tuple, items)
+        else:
+            items = []
+            for path, row in itertools.izip(paths, data):
+                item = self._load_nested(
+                    row, kinds[1:],
+                    ['%s/_%d' % (path, j) for j in xrange(len(row))])
+                if kind == 't':
+                    item = tuple(item)
+                items.append(item)
+        # items already loaded, eg. through references, are kept
+        memo = self.memo
+        return [memo.setdefault(path, item)
+                for path, item in itertools.izip(paths, items)]
+
+    def _fill_out(self, path, data):
+        """
+        Copy the array `data` into the array preallocated for `path` in
+        `out`, if any, and return the array to use.
+        """
+        out = self.out.get(path)
+        if out is None:
+            return data
+        if (out.shape != data.shape or data.dtype.newbyteorder('=')
+                != out.dtype.newbyteorder('=')):
+            raise ValueError("shape mismatch for %s: %r %s in file, %r %s "
+                             "in out" % (path, data.shape, data.dtype,
+                                         out.shape, out.dtype))
+        if not out.flags.writeable:
+            raise ValueError("out array for %s is read-only" % path)
+        out[...] = data
+        return out
+
+    def _load_instance_columns(self, node):
+        path = self.file.get_pathname(node)
+        items = [None] * self.file.get_attr(node, 'length')
+        self.memo[path] = items
+
+        cls = self._load_class(node, 'cls')
+        if self.file.has_path('%s/__/rows' % path):
+            rows = self.file.read(
+                self.file.get_path('%s/__/rows' % path)).tolist()
+        else:
+            rows = range(len(items))
+        names = self.file.get_children(
+            self.file.get_path('%s/__/attrs' % path))
+        columns = [self._load_column(
+                       self.file.get_path('%s/__/attrs/%s' % (path, name)),
+                       ['%s/_%d/%s' % (path, i, name) for i in rows])
+                   for name in names]
+
+        for i, values in itertools.izip(rows, itertools.izip(*columns)):
+            if type(cls) is ClassType:
+                inst = self._instantiate(cls, ())
+            else:
+                inst = cls.__new__(cls)
+            self._setstate(inst, dict(itertools.izip(names, values)))
+            items[i] = inst
+            self.memo['%s/_%d' % (path, i)] = inst
+
+        if len(rows) < len(items):
+            rows = set(rows)
+            for i in xrange(len(items)):
+                if not i in rows:
+                    items[i] = self.load('%s/_%d' % (path, i))
+        return items
+
     def _load_tuple(self, node):
         return tuple(self._load_list_content(node))
     _dispatch[TUPLE] = _load_tuple
@@ -781,23 +2452,95 @@ class Unpickler(object):
         return self._load_list_content(node)
     _dispatch[LIST] = _load_list
 
+    def _load_set(self, node):
+        return set(self._load_list_content(node))
+    _dispatch[SET] = _load_set
+
+    def _load_frozenset(self, node):
+        return frozenset(self._load_list_content(node))
+    _dispatch[FROZENSET] = _load_frozenset
+
+    def _load_container_subclass(self, node):
+        path = self.file.get_pathname(node)
+        cls = self._load_class(node, 'cls')
+
+        if issubclass(cls, tuple):
+            base = self.load('%s/__/base' % path)
+            if hasattr(cls, '_make') and hasattr(cls, '_fields'):
+                obj = cls._make(base) # namedtuple
+            else:
+                obj = tuple.__new__(cls, base)
+            self.memo[path] = obj
+        else:
+            if self.file.has_path('%s/__/args' % path):
+                args = self.load('%s/__/args' % path)
+            else:
+                args = ()
+            if self.file.has_attr(node, 'call_cls'):
+                obj = cls(*args)
+            else:
+                obj = cls.__new__(cls, *args)
+            self.memo[path] = obj
+
+            base = self.load('%s/__/base' % path)
+            if issubclass(cls, list):
+                obj.extend(base)
+            elif self.file.has_path('%s/__/keys' % path):
+                for key in self.load('%s/__/keys' % path):
+                    obj[key] = base[key]
+            else:
+                for key, value in base.iteritems():
+                    obj[key] = value
+
+        if self.file.has_path('%s/__/content' % path):
+            state = self.load('%s/__/content' % path)
+            if state is not None:
+                self._setstate(obj, state)
+        elif self.file.has_attr(node, 'has_reduce_content'):
+            state = {}
+            state = self._load_dict_content(node, state)
+            self._setstate(obj, state)
+        return obj
+    _dispatch[SUBCLASS] = _load_container_subclass
+
     def _load_dict(self, node):
-        path = node._v_pathname
+        path = self.file.get_pathname(node)
         data = {}
         self.memo[path] = data
+        if self.file.has_attr(node, 'columns'):
+            keys = self._load_list_content(
+                self.file.get_path('%s/__/keys' % path))
+            values = self._load_list_content(
+                self.file.get_path('%s/__/values' % path))
+            data.update(itertools.izip(keys, values))
+            return data
+        if self.file.has_attr(node, 'buckets'):
+            for i in xrange(self.file.get_attr(node, 'buckets')):
+                self._load_dict_content(
+                    self.file.get_path('%s/_b%d' % (path, i)), data)
+            return data
         return self._load_dict_content(node, data)
 
     def _load_dict_content(self, node, data):
-        path = node._v_pathname
+        path = self.file.get_pathname(node)
         strkeys = {}
 
-        if '__' in node._v_children:
-            n2 = node._v_children['__']
-            for name in n2._v_children:
+        names = self.file.get_children(node)
+        if '__' in names:
+            n2 = self.file.get_path('%s/__' % path)
+            for name in self.file.get_children(n2):
                 if name.startswith('_'):
                     strkeys[name] = self.load('%s/__/%s' % (path, name))
-
-        for key in node._v_children:
+                elif name == 'pool':
+                    pooled = self.file.read(
+                        self.file.get_path('%s/__/pool' % path))
+                    for i, index, is_unicode in pooled.tolist():
+                        key = self._pooled_string(index)
+                        if is_unicode:
+                            key = key.decode('utf-8')
+                        strkeys['_%d' % i] = key
+
+        for key in names:
             if key == '__': continue
 
             if key in strkeys:
@@ -835,11 +2578,32 @@ class Unpickler(object):
                     klass.__name__, str(err)), sys.exc_info()[2]
         return value
 
+    def _load_class(self, node, name):
+        """Load a class or function saved by `Pickler._save_class`."""
+        try:
+            index = int(self.file.get_attr(node, '%s_id' % name))
+        except AttributeError:
+            return self.load('%s/__/%s' % (self.file.get_pathname(node),
+                                           name))
+        obj = self._class_cache.get(index)
+        if obj is None:
+            if self._classes is None:
+                self._classes = self.file.load_strings(
+                    self.file.get_path(CLASS_TABLE_PATH))
+            module, name = self._classes[index].split('\n')
+            obj = self._class_cache[index] = self._find_class(module, name)
+        return obj
+
+    def _load_args(self, path):
+        if self.file.has_path('%s/__/args' % path):
+            return self.load('%s/__/args' % path)
+        return () # empty args are not saved with a class table
+
     def _load_inst(self, node):
-        path = node._v_pathname
+        path = self.file.get_pathname(node)
 
-        cls = self.load('%s/__/cls' % path)
-        args = self.load('%s/__/args' % path)
+        cls = self._load_class(node, 'cls')
+        args = self._load_args(path)
 
         inst = self._instantiate(cls, args)
 
@@ -898,19 +2662,76 @@ class Unpickler(object):
 
     def _load_numeric_array(self, node):
         import Numeric
-        return Numeric.asarray(node.read())
+        return Numeric.asarray(self.file.read(node))
     _dispatch[NUMERIC] = _load_numeric_array
 
     def _load_numpy_array(self, node):
         import numpy
-        return numpy.asarray(node.read())
+        out = self.out.get(self.file.get_pathname(node))
+        if out is not None:
+            return self.file.read_into(node, out)
+        if self.mmap:
+            data = self.file.map_array(node)
+            if data is not None:
+                return data
+        return numpy.asarray(self.file.read(node))
     _dispatch[NUMPY] = _load_numpy_array
 
+    def _load_numpy_record(self, node):
+        shape = _str_to_shape(self.file.get_attr(node, 'shape'))
+        return numpy.asarray(self.file.read(node)).reshape(shape)
+    _dispatch[NUMPY_RECORD] = _load_numpy_record
+
+    def _load_numpy_datetime(self, node):
+        dtype = numpy.dtype(self.file.get_attr(node, 'dtype'))
+        data = numpy.asarray(self.file.read(node))
+        return data.astype(numpy.int64, copy=False).view(dtype)
+    _dispatch[NUMPY_DATETIME] = _load_numpy_datetime
+
+    def _load_numpy_bits(self, node):
+        shape = _str_to_shape(self.file.get_attr(node, 'shape'))
+        data = self.file.load_bits(node).reshape(shape)
+        return self._fill_out(self.file.get_pathname(node), data)
+    _dispatch[NUMPY_BITS] = _load_numpy_bits
+
+    def _load_numpy_object(self, node):
+        shape = _str_to_shape(self.file.get_attr(node, 'shape'))
+        if self.file.has_attr(node, 'strtype'):
+            items = self.file.load_vlstrings(node)
+            if self.file.get_attr(node, 'strtype') == 'unicode':
+                items = [item.decode('utf-8') for item in items]
+        else:
+            items = self._load_list_content(node)
+        data = numpy.empty((len(items),), dtype=numpy.object_)
+        for i, item in enumerate(items):
+            data[i] = item
+        return data.reshape(shape)
+    _dispatch[NUMPY_OBJECT] = _load_numpy_object
+
     def _load_numarray_array(self, node):
         import numarray
-        return numarray.asarray(node.read())
+        return numarray.asarray(self.file.read(node))
     _dispatch[NUMARRAY] = _load_numarray_array
 
+    def _load_sparse_matrix(self, node):
+        import scipy.sparse
+        path = self.file.get_pathname(node)
+        format = self.file.get_attr(node, 'format')
+        shape = _str_to_shape(self.file.get_attr(node, 'shape'))
+        def read(name):
+            return self.file.read(self.file.get_path('%s/%s' % (path, name)))
+        if format == 'coo':
+            return scipy.sparse.coo_matrix(
+                (read('data'), (read('row'), read('col'))), shape=shape)
+        cls = getattr(scipy.sparse, '%s_matrix' % format)
+        return cls((read('data'), read('indices'), read('indptr')),
+                   shape=shape)
+    _dispatch[SPARSE] = _load_sparse_matrix
+
+    def _load_numpy_scalar(self, node):
+        return numpy.asarray(self.file.read(node))[()]
+    _dispatch[NUMPY_SCALAR] = _load_numpy_scalar
+
     def _get_extension(self, code):
         nil = []
         obj = _extension_cache.get(code, nil)
@@ -932,47 +2753,218 @@ class Unpickler(object):
         return klass
 
 
+#############################################################################
+
+_builtin_pickletypes = frozenset(Unpickler._dispatch)
+_registry = {}
+
+def register(cls, saver, loader, pickletype):
+    """
+    Register custom functions for saving and loading instances of `cls`.
+
+    The saver is called as ``saver(pickler, path, obj)`` and should create
+    a node at `path` for `obj`, and return it. The loader is called as
+    ``loader(unpickler, node)`` and should return the object. The
+    `_FileInterface` to the file is available as the ``file`` attribute
+    of both, and sub-objects can be saved and loaded with their `dump`
+    and `load` methods.
+
+    :param cls: the exact type to handle
+    :param saver: function saving instances
+    :param loader: function loading instances
+    :param pickletype:
+        string stored in the pickletype attribute of the saved nodes,
+        must not conflict with built-in types
+    """
+    if pickletype in _builtin_pickletypes:
+        raise ValueError("pickletype %r is reserved" % pickletype)
+    for other_cls, (other_type, old) in _registry.iteritems():
+        if other_type == pickletype and other_cls is not cls:
+            raise ValueError("pickletype %r already registered for %r"
+                             % (pickletype, other_cls))
+
+    def save(self, path, obj):
+        node = saver(self, path, obj)
+        self.file.set_attr(node, 'pickletype', pickletype)
+        return node
+
+    if cls in _registry:
+        unregister(cls)
+    _registry[cls] = (pickletype, Pickler._dispatch.get(cls))
+    Pickler._dispatch[cls] = save
+    Pickler._subclass_dispatch.clear()
+    Unpickler._dispatch[pickletype] = loader
+
+def unregister(cls):
+    """
+    Remove custom functions registered for `cls` with `register`.
+    """
+    pickletype, old = _registry.pop(cls)
+    if old is None:
+        del Pickler._dispatch[cls]
+    else:
+        Pickler._dispatch[cls] = old
+    Pickler._subclass_dispatch.clear()
+    del Unpickler._dispatch[pickletype]
+
+
 #############################################################################
 
 
 class _EmptyClass:
     pass
 
-pythonIdRE = re.compile('^[a-zA-Z_][a-zA-Z0-9_]*$')
-reservedIdRE = re.compile('^_[cfgv]_')
-def _checkNameValidity(name):
+# Python identifiers, except those reserved by PyTables
+validNameRE = re.compile('^(?!_[cfgv]_)[a-zA-Z_][a-zA-Z0-9_]*$')
+def _isValidName(name):
     """
     Check the validity of the `name` of a PyTables object,
     so that PyTables won't spew warnings or exceptions...
     """
-    if not isinstance(name, basestring):  # Python >= 2.3
-        raise TypeError()
-    if name == '':
-        raise ValueError()
-    if name == '.':
-        raise ValueError()
-    if '/' in name:
-        raise ValueError()
-    if not pythonIdRE.match(name):
-        raise ValueError()
-    if keyword.iskeyword(name):
-        raise ValueError()
-    if reservedIdRE.match(name):
-        raise ValueError()
+    return (isinstance(name, basestring)
+            and validNameRE.match(name) is not None
+            and not keyword.iskeyword(name))
+
+def _defining_class(t, name):
+    for klass in t.__mro__:
+        if name in klass.__dict__:
+            return klass
+    return None
+
+def _ordereddict_reduce(obj):
+    # state as in OrderedDict.__reduce__
+    state = vars(obj).copy()
+    for key in vars(collections.OrderedDict()):
+        state.pop(key, None)
+    return (), state, True
+
+def _defaultdict_reduce(obj):
+    return (obj.default_factory,), None, False
+
+_container_reduce = {
+    collections.OrderedDict: _ordereddict_reduce,
+    collections.defaultdict: _defaultdict_reduce,
+    }
+
+def _container_base(t):
+    """
+    The basic container type whose layout can store instances of `t`, a
+    subclass of dict, list or tuple, or None if `t` customizes pickling
+    in a way that requires the generic reduce path.
 
-def _check_pytables_name(key):
+    Known subclasses from the standard library count as base types.
+    """
     try:
-        _checkNameValidity(key)
-        return True
-    except:
-        return False
+        mro = t.__mro__
+    except AttributeError:
+        return None
+
+    for base in mro:
+        if base in _container_reduce:
+            break
+        elif base in (dict, list, tuple):
+            if base is t:
+                return None
+            break
+    else:
+        return None
+
+    if _defining_class(t, '__reduce_ex__') is not object:
+        return None
+    if base in _container_reduce:
+        if _defining_class(t, '__reduce__') is not base:
+            return None
+    elif _defining_class(t, '__reduce__') is not object:
+        return None
+
+    for klass in mro[:mro.index(base)]:
+        slots = klass.__dict__.get('__slots__', ())
+        if isinstance(slots, basestring):
+            slots = [slots]
+        for name in slots:
+            if name not in ('__dict__', '__weakref__'):
+                return None # slot values would be lost
+
+    if (_defining_class(t, '__getnewargs__') not in (None, base)
+            and not hasattr(t, '_make')):
+        return None # only namedtuples are known to pass the contents
+
+    return base
+
+def _shape_to_str(shape):
+    return str(tuple(shape))
+
+def _str_to_shape(s):
+    return tuple([int(x) for x in s.strip('()').split(',') if x.strip()])
 
+_name_cache = {}
+_NAME_CACHE_SIZE = 10000
+"""Maximum number of validated names remembered"""
+
+def _check_pytables_name(key):
+    """
+    Whether `key` is usable as a node name. Results for strs are cached,
+    as the same attribute names recur across many instances.
+    """
+    if type(key) is not str:
+        return _isValidName(key)
+    valid = _name_cache.get(key)
+    if valid is None:
+        valid = _isValidName(key)
+        if len(_name_cache) >= _NAME_CACHE_SIZE:
+            _name_cache.clear()
+        _name_cache[key] = valid
+    return valid
+
+
+_KEY_INDEX_MIN = 64
+"""Number of surrogate keys above which dicts get a key index"""
+
+_INSTANCE_COLUMNS_MIN = 8
+"""Number of similar instances above which lists are saved in columns"""
+
+_INSTANCE_COLUMN_TYPES = frozenset([int, long, float, complex, bool, str,
+                                    unicode, numpy.ndarray])
+
+def _key_hash(key):
+    """
+    Hash of a dict key that is the same across processes and platforms,
+    and for keys that compare equal (1 == 1L == 1.0, 'a' == u'a').
+    None if there is no such hash for the type of `key`.
+    """
+    t = type(key)
+    if t in (int, long, bool) or (t is float and key.is_integer()):
+        data = 'i%d' % key
+    elif t is float:
+        data = 'f' + repr(key)
+    elif t is str:
+        data = 's' + key
+    elif t is unicode:
+        try:
+            data = 's' + key.encode('ascii')
+        except UnicodeError:
+            data = 'u' + key.encode('utf-8')
+    elif t is tuple:
+        items = map(_key_hash, key)
+        if None in items:
+            return None
+        data = 't' + ','.join(map(str, items))
+    else:
+        return None
+    return zlib.crc32(data) & 0xffffffff
+
+def _key_bucket(key, n):
+    """Index of the bucket of `n` for a dict key."""
+    h = _key_hash(key)
+    if h is None:
+        return 0
+    return h % n
 
 #############################################################################
 
-def _with_open_file(file, func, mode):
-    if not isinstance(file, tables.File):
-        file = tables.openFile(file, mode)
+def _with_open_file(file, func, mode, backend=None, latest_format=False):
+    if isinstance(file, basestring):
+        file = _get_backend(backend).open_file(file, mode, latest_format)
         try:
             return func(file)
         finally:
@@ -980,37 +2972,92 @@ def _with_open_file(file, func, mode):
     else:
         return func(file)
 
-def dump(obj, file, path, type_map=None):
+_core_names = itertools.count()
+
+def _open_core_file(mode, image=None):
+    # PyTables keeps track of open files by name, so each in-memory file
+    # needs an unique one
+    name = 'hdf5pickle-core-%d.h5' % _core_names.next()
+    if tables is None:
+        import h5py
+        if image is not None:
+            return h5py.File(h5py.h5f.open_file_image(image))
+        return h5py.File(name, mode, driver='core', backing_store=False)
+    kw = dict(driver='H5FD_CORE', driver_core_backing_store=0)
+    if image is not None:
+        kw['driver_core_image'] = image
+    return tables.openFile(name, mode, **kw)
+
+def _get_file_image(file):
+    if tables is None:
+        return file.id.get_file_image()
+    return file.get_file_image()
+
+def dump(obj, file, path, type_map=None, backend=None, string_pool=False,
+         bucket_size=None, latest_format=False, class_table=False,
+         pack_bools=False):
     """
     Dump a Python object to an open PyTables HDF5 file.
 
     :param obj:  the object to dump
     :param file: where to dump
-    :type  file: tables.File, or, str
+    :type  file: tables.File, h5py.File, or, str
     :param path: path where to dump in the file
     :param type_map:
         mapping of Python basic types (str, int, ...) to numpy types.
         If ``None``, numpy's default mapping is used.
+    :param backend:
+        HDF5 library to use, 'tables' or 'h5py'. If ``None``, guessed
+        from `file`; for file names, PyTables is used if it is installed
+        and h5py otherwise.
+    :param string_pool:
+        store strings and non-name dict keys once per file, see `Pickler`
+    :param bucket_size:
+        split lists and dicts longer than this into subgroups, see `Pickler`
+    :param latest_format:
+        if `file` is a file name, open it with the latest HDF5 file format
+        (compact and dense link storage, link creation order tracked).
+        Requires the h5py backend.
+    :param class_table:
+        name classes of instances once per file, see `Pickler`
+    :param pack_bools:
+        bit-pack numpy bool arrays, see `Pickler`
     """
     def _dump(f):
-        Pickler(f, type_map=type_map).dump(path, obj)
-    _with_open_file(file, _dump, 'a')
+        Pickler(f, type_map=type_map, backend=backend,
+                string_pool=string_pool, bucket_size=bucket_size,
+                class_table=class_table, pack_bools=pack_bools).dump(path, obj)
+    _with_open_file(file, _dump, 'a', backend, latest_format)
 
-def load(file, path):
+def load(file, path, mmap=False, out=None, target=None, backend=None):
     """
     Load a Python object from an open PyTables HDF5 file.
 
     :param file: where to load from
-    :type  file: tables.File, or, str
+    :type  file: tables.File, h5py.File, or, str
     :param path: path to the object in the file
+    :param mmap:
+        if True, numpy arrays stored contiguously and uncompressed are
+        returned as read-only `numpy.memmap` views to the file instead
+        of being read into memory. Requires h5py.
+    :param out:
+        mapping of paths in the file to preallocated numpy arrays,
+        into which the arrays at these paths are read
+    :param target:
+        a previously loaded object of the same structure; the numpy
+        arrays in it are refilled in place instead of allocating new ones
+    :param backend: HDF5 library to use, as in `dump`
 
     :return: loaded object
     """
     def _load(f):
-        return Unpickler(f).load(path)
-    return _with_open_file(file, _load, 'r')
+        u = Unpickler(f, mmap=mmap, out=out, backend=backend)
+        return u.load(path, target=target)
+    return _with_open_file(file, _load, 'r', backend)
 
-def dump_many(file, desc, type_map=None):
+def dump_many(file, desc, type_map=None, backend=None, string_pool=False,
+              bucket_size=None, latest_format=False, class_table=False,
+              pack_bools=False):
     """
     Dump multiple Python objects to an open PyTables HDF5 file,
     preserving any references between the objects.
@@ -1019,19 +3066,27 @@ def dump_many(file, desc, type_map=None):
     to each other would result in duplicated data.
 
     :param file: where to dump
-    :type  file: tables.File
+    :type  file: tables.File, h5py.File, or, str
     :param desc: a list of (path, obj)
     :param type_map:
         mapping of Python basic types (str, int, ...) to numpy types.
         If ``None``, numpy's default mapping is used.
+    :param backend: HDF5 library to use, as in `dump`
+    :param string_pool: whether to pool strings, as in `dump`
+    :param bucket_size: size of subgroups for large containers, as in `dump`
+    :param latest_format: whether to use the latest file format, as in `dump`
+    :param class_table: whether to use a class table, as in `dump`
+    :param pack_bools: whether to bit-pack numpy bool arrays, as in `dump`
     """
     def _dump(f):
-        p = Pickler(f, type_map=type_map)
+        p = Pickler(f, type_map=type_map, backend=backend,
+                    string_pool=string_pool, bucket_size=bucket_size,
+                    class_table=class_table, pack_bools=pack_bools)
         for path, obj in desc:
             p.dump(path, obj)
-    _with_open_file(file, _dump, 'a')
+    _with_open_file(file, _dump, 'a', backend, latest_format)
 
-def load_many(file, paths):
+def load_many(file, paths, mmap=False, backend=None):
     """
     Load multiple Python objects from the file, preserving any
     references between them.
@@ -1040,17 +3095,113 @@ def load_many(file, paths):
     to each other would result to duplicated data.
 
     :param file: where to dump
-    :type  file: tables.File
+    :type  file: tables.File, h5py.File, or, str
     :param paths: a list of paths where to load from
+    :param mmap: memory-map contiguous numpy arrays, as in `load`
+    :param backend: HDF5 library to use, as in `dump`
 
     :return: list of (path, object)
     """    
     def _load(f):
-        p = Unpickler(f)
+        p = Unpickler(f, mmap=mmap, backend=backend)
         r = []
         for path in paths:
             obj = p.load(path)
             r.append( (path, obj) )
         return r
-    return _with_open_file(file, _load, 'r')
+    return _with_open_file(file, _load, 'r', backend)
+
+def load_sparse_rows(file, path, start, stop, backend=None):
+    """
+    Load rows ``start:stop`` of a CSR sparse matrix saved in a HDF5 file,
+    reading only the parts of the data needed.
+
+    :param file: where to load from
+    :type  file: tables.File, h5py.File, or, str
+    :param path: path to the matrix in the file
+    :param start: first row
+    :param stop: end row, exclusive
+    :param backend: HDF5 library to use, as in `dump`
+
+    :return: a `scipy.sparse.csr_matrix` of ``stop - start`` rows
+    """
+    import scipy.sparse
+    def _load(f):
+        fi = _get_file_interface(f, None, backend)
+        node = fi.get_path(path)
+        if (not fi.has_attr(node, 'pickletype')
+                or fi.get_attr(node, 'pickletype') != SPARSE
+                or fi.get_attr(node, 'format') != 'csr'):
+            raise TypeError("%s is not a CSR matrix" % path)
+        nrows, ncols = _str_to_shape(fi.get_attr(node, 'shape'))
+        start_, stop_, step = slice(start, stop).indices(nrows)
+        stop_ = max(start_, stop_)
+        indptr = fi.read_slice(fi.get_path('%s/indptr' % path),
+                               start_, stop_ + 1)
+        lo, hi = int(indptr[0]), int(indptr[-1])
+        data = fi.read_slice(fi.get_path('%s/data' % path), lo, hi)
+        indices = fi.read_slice(fi.get_path('%s/indices' % path), lo, hi)
+        return scipy.sparse.csr_matrix((data, indices, indptr - lo),
+                                       shape=(stop_ - start_, ncols))
+    return _with_open_file(file, _load, 'r', backend)
+
+def load_item(file, path, key, backend=None):
+    """
+    Load the value for one key of a dict saved in a HDF5 file, without
+    loading the rest of the dict.
+
+    Dicts with many keys that are not valid node names are saved with
+    an index of key hashes, so that only the matching key and value are
+    read.
 
+    :param file: where to load from
+    :type  file: tables.File, h5py.File, or, str
+    :param path: path to the dict in the file
+    :param key: key to look up
+    :param backend: HDF5 library to use, as in `dump`
+
+    :return: ``dict[key]``
+    :raise KeyError: if the key is not in the dict
+    """
+    def _load(f):
+        return Unpickler(f, backend=backend).load_item(path, key)
+    return _with_open_file(file, _load, 'r', backend)
+
+def dumps(obj, path='/obj', type_map=None):
+    """
+    Dump a Python object to an in-memory HDF5 file, and return the file
+    image as a string. Nothing is written to disk.
+
+    Requires PyTables >= 3.0, or h5py if PyTables is not installed, and
+    HDF5 >= 1.8.9.
+
+    :param obj:  the object to dump
+    :param path: path where to dump in the file
+    :param type_map:
+        mapping of Python basic types (str, int, ...) to numpy types.
+        If ``None``, numpy's default mapping is used.
+
+    :return: HDF5 file image
+    """
+    f = _open_core_file('w')
+    try:
+        Pickler(f, type_map=type_map).dump(path, obj)
+        f.flush()
+        return _get_file_image(f)
+    finally:
+        f.close()
+
+def loads(data, path='/obj'):
+    """
+    Load a Python object from a HDF5 file image, as returned by `dumps`.
+
+    :param data: HDF5 file image
+    :param path: path to the object in the file
+
+    :return: loaded object
+    """
+    f = _open_core_file('r', data)
+    try:
+        return Unpickler(f).load(path)
+    finally:
+        f.close()
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+"""
+Timing benchmarks for dumping and loading large objects.
+
+Run as ``python -m test.bench [n]`` from the source directory;
+``n`` is the number of list items (default 10 000 000).
+"""
+import os, sys, time, tempfile
+import hdf5pickle
+
+def timeit(label, func, *args):
+    start = time.time()
+    result = func(*args)
+    print "%-24s %8.3f s" % (label, time.time() - start)
+    return result
+
+def bench_list(name, data):
+    fd, filename = tempfile.mkstemp(suffix='.h5')
+    os.close(fd)
+    try:
+        timeit("dump %s" % name, hdf5pickle.dump, data, filename, '/obj')
+        timeit("load %s" % name, hdf5pickle.load, filename, '/obj')
+    finally:
+        os.unlink(filename)
+
+def main(n=10000000):
+    bench_list("int list", range(n))
+    bench_list("float list", [float(x) for x in xrange(n)])
+    bench_list("str list", [str(x) for x in xrange(n)])
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
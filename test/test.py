@@ -98,6 +98,17 @@ Basic types
     >>> saveload(12345678910111213141516178920L)
     12345678910111213141516178920L
 
+Longs that fit in 64 bits are stored as plain integers:
+
+    >>> saveload(2L**64 - 1)
+    18446744073709551615L
+    >>> loadnode().dtype, loadnode().shape
+    (dtype('uint64'), ())
+    >>> saveload([-1L, 2L**40])
+    [-1L, 1099511627776L]
+    >>> loadnode().dtype
+    dtype('int64')
+
     >>> saveload(0.5)
     0.5
 
@@ -122,10 +133,60 @@ Homogenous list should be saved as arrays:
     >>> type(loadnode()) # doctest: +ELLIPSIS
     <class 'tables...Array'>
 
-    >>> saveload(['a', 'b', 'c', 'd', 'e', 'f'])
-    ['a', 'b', 'c', 'd', 'e', 'f']
+Lists of strings are stored as one concatenated string and the offsets
+of the items:
+
+    >>> saveload(['a', 'bc', '', 'd\x00e', 'f'])
+    ['a', 'bc', '', 'd\x00e', 'f']
     >>> type(loadnode()) # doctest: +ELLIPSIS
     <class 'tables...Group'>
+    >>> loaditem('/obj/offsets').tolist()
+    [1, 3, 3, 6, 7]
+    >>> saveload((u'J\xf8rgen', u'Bj\xfcrstr\xf6m'))
+    (u'J\xf8rgen', u'Bj\xfcrstr\xf6m')
+
+As should nested rectangular lists, and lists of equal-shape arrays:
+
+    >>> saveload([[1., 2., 3.], [4., 5., 6.]])
+    [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]]
+    >>> map(int, loadnode().shape)
+    [2, 3]
+    >>> saveload([(1, 2), (3, 4)])
+    [(1, 2), (3, 4)]
+    >>> import numpy
+    >>> saveload([numpy.arange(3), numpy.arange(3, 6)])
+    [array([0, 1, 2]), array([3, 4, 5])]
+    >>> map(int, loadnode().shape)
+    [2, 3]
+
+References to the inner items are kept:
+
+    >>> x = [[1, 2], [3, 4]]
+    >>> y = saveload([x, x[0]])
+    >>> y[0][0] is y[1]
+    True
+    >>> y = saveload([x[0], x])
+    >>> y[1][0] is y[0]
+    True
+
+Lists of bools are packed eight to a byte, and numpy bool arrays too if
+asked:
+
+    >>> saveload([True, False] * 10)
+    [True, False, True, False, True, False, True, False, True, False, True, False, True, False, True, False, True, False, True, False]
+    >>> map(int, loadnode().shape)
+    [3]
+    >>> x = numpy.arange(30).reshape(3, 10) % 3 == 0
+    >>> saveload(x).dtype, loadnode()._v_attrs.pickletype
+    (dtype('bool'), 'NP')
+    >>> f = tables.openFile('hdf5test.h5', 'w')
+    >>> p.dump(x, f, '/obj', pack_bools=True)
+    >>> f.close()
+    >>> y = p.load('hdf5test.h5', '/obj')
+    >>> y.dtype, y.shape, bool((x == y).all())
+    (dtype('bool'), (3, 10), True)
+    >>> loadnode()._v_attrs.pickletype, map(int, loadnode().shape)
+    ('NB', [4])
 
 Mixed list not so:
 
@@ -168,6 +229,25 @@ As should empty strings and "empty" longs
     u''
 
 
+Sets
+----
+
+Homogenous sets are saved as single sorted arrays:
+
+    >>> saveload(set([5, 3, 9, 1]))
+    set([1, 3, 5, 9])
+    >>> loaditem('/obj')
+    array([1, 3, 5, 9])
+
+    >>> y = saveload(frozenset([1, 'a', (2, 3)])); type(y), sorted(y)
+    (<type 'frozenset'>, [1, 'a', (2, 3)])
+    >>> type(loadnode()) # doctest: +ELLIPSIS
+    <class 'tables...Group'>
+
+    >>> saveload(set())
+    set([])
+
+
 Dicts
 -----
 
@@ -187,6 +267,120 @@ Dicts with evil keys:
     >>> y = y.items(); y.sort(); y
     [('class', 3), ('in', 3), ('type', 3)]
 
+Such dicts with packable keys and values are stored as two arrays:
+
+    >>> y = saveload(dict(zip(range(1000), numpy.arange(2000.).reshape(1000, 2))))
+    >>> len(y), y[999].tolist()
+    (1000, [1998.0, 1999.0])
+    >>> sorted(loadnode('/obj/__')._v_children.keys())
+    ['keys', 'values']
+    >>> map(int, loadnode('/obj/__/values').shape)
+    [1000, 2]
+
+    >>> y = saveload({1: 'a', 2: 3})
+    >>> y = y.items(); y.sort(); y
+    [(1, 'a'), (2, 3)]
+    >>> sorted(loadnode('/obj/__')._v_children.keys())
+    ['_0', '_1']
+
+References to packed keys and values are kept, also if the dict falls
+back to being stored per entry:
+
+    >>> d = {1: [1, 2], 2: [3, 4]}
+    >>> y = saveload([d, d[1]])
+    >>> y[0][1] is y[1]
+    True
+    >>> t = (1, 2)
+    >>> y = saveload([{t: 'a', (3, 4): t}, t])
+    >>> y[0][(3, 4)] is y[1]
+    True
+
+Single entries can be loaded without loading the whole dict. Dicts with
+many such keys carry an index of key hashes for this:
+
+    >>> x = dict(('/k/%d' % i, i) for i in range(100))
+    >>> x[1] = 'one'
+    >>> y = saveload(x)
+    >>> p.load_item('hdf5test.h5', '/obj', '/k/42')
+    42
+    >>> p.load_item('hdf5test.h5', '/obj', 1.0)
+    'one'
+    >>> map(int, loadnode('/obj/__/index').shape)
+    [101, 2]
+    >>> p.load_item('hdf5test.h5', '/obj', 'nonexistent')
+    Traceback (most recent call last):
+      ...
+    KeyError: 'nonexistent'
+
+Names standing for other keys are not keys, and str and unicode keys
+that compare equal are found either way:
+
+    >>> y = saveload({5: 'five', 'a': 1, u'b': 2})
+    >>> p.load_item('hdf5test.h5', '/obj', '_0')
+    Traceback (most recent call last):
+      ...
+    KeyError: '_0'
+    >>> p.load_item('hdf5test.h5', '/obj', u'a')
+    1
+    >>> p.load_item('hdf5test.h5', '/obj', 'b')
+    2
+
+In dicts stored as two arrays, only the row of the value is read:
+
+    >>> y = saveload(dict((i, u'v%d' % i) for i in range(100)))
+    >>> p.load_item('hdf5test.h5', '/obj', 42)
+    u'v42'
+    >>> y = saveload(dict((i, [i, -i]) for i in range(100)))
+    >>> p.load_item('hdf5test.h5', '/obj', 42)
+    [42, -42]
+
+and the key is looked up by bisection in sorted numbers, or through an
+index of key hashes:
+
+    >>> loadnode('/obj/__/keys')._v_attrs.sorted
+    1
+    >>> p.load_item('hdf5test.h5', '/obj', 42.0)
+    [42, -42]
+    >>> p.load_item('hdf5test.h5', '/obj', 99)
+    [99, -99]
+    >>> p.load_item('hdf5test.h5', '/obj', 100)
+    Traceback (most recent call last):
+      ...
+    KeyError: 100
+    >>> y = saveload(dict(('/k%d' % i, i) for i in range(100)))
+    >>> p.load_item('hdf5test.h5', '/obj', u'/k42')
+    42
+    >>> map(int, loadnode('/obj/__/index').shape)
+    [100, 2]
+
+
+Container subclasses
+--------------------
+
+Subclasses of dicts, lists and tuples are saved like their base types,
+with the class recorded once:
+
+    >>> import collections
+    >>> Point = collections.namedtuple('Point', 'x y')
+    >>> modulelevel(Point)
+    >>> saveload(Point(1, 2))
+    Point(x=1, y=2)
+    >>> loaditem('/obj/__/base')
+    array([1, 2])
+
+    >>> saveload(collections.OrderedDict([('b', 1), ('a', 2), ('c', 3)]))
+    OrderedDict([('b', 1), ('a', 2), ('c', 3)])
+
+    >>> y = saveload(collections.defaultdict(list, {'a': [1]}))
+    >>> y['b'], y['a']
+    ([], [1])
+
+    >>> class MyList(list):
+    ...     pass
+    >>> modulelevel(MyList)
+    >>> x = MyList([1, 2, 'a']); x.foo = 'bar'
+    >>> y = saveload(x); type(y).__name__, y, y.foo
+    ('MyList', [1, 2, 'a'], 'bar')
 
 Classes
 -------
@@ -405,6 +599,34 @@ Ditto for nested instances
     array(222)
 
 
+Custom serializers
+------------------
+
+Types can be given their own layout:
+
+    >>> class Particle(object):
+    ...     def __init__(self, pos, mass):
+    ...         self.pos, self.mass = pos, mass
+    >>> def save_particle(pickler, path, obj):
+    ...     return pickler.file.save_array(path, list(obj.pos) + [obj.mass])
+    >>> def load_particle(unpickler, node):
+    ...     data = unpickler.file.load_array(node, list)
+    ...     return Particle(data[:-1], data[-1])
+    >>> p.register(Particle, save_particle, load_particle, 'particle')
+    >>> y = saveload(Particle([1., 2., 3.], 4.))
+    >>> y.pos, y.mass
+    ([1.0, 2.0, 3.0], 4.0)
+    >>> loaditem('/obj').tolist()
+    [1.0, 2.0, 3.0, 4.0]
+    >>> loadnode()._v_attrs.pickletype
+    'particle'
+
+    >>> p.register(Particle, save_particle, load_particle, 'RR')
+    Traceback (most recent call last):
+      ...
+    ValueError: pickletype 'RR' is reserved
+    >>> p.unregister(Particle)
+
 Array types
 -----------
 
@@ -423,6 +645,329 @@ Array types
     ...         else:
     ...             assert a.typecode() == a2.typecode()
 
+Numpy scalars are saved as zero-dimensional arrays of the same type:
+
+    >>> import numpy
+    >>> x = saveload(numpy.float32(1.5)); x, type(x)
+    (1.5, <type 'numpy.float32'>)
+    >>> loadnode().shape
+    ()
+    >>> x = saveload([numpy.int16(-3), numpy.bool_(True)]); x, map(type, x)
+    ([-3, True], [<type 'numpy.int16'>, <type 'numpy.bool_'>])
+
+Record, datetime and object arrays have their own representations:
+
+    >>> x = numpy.zeros((2, 2), dtype=[('a', 'i4'), ('b', 'f8')])
+    >>> x['a'] = [[1, 2], [3, 4]]
+    >>> y = saveload(x); y.dtype == x.dtype, y.shape, y['a'].tolist()
+    (True, (2, 2), [[1, 2], [3, 4]])
+    >>> type(loadnode()) # doctest: +ELLIPSIS
+    <class 'tables...Table'>
+
+    >>> x = numpy.array(['2006-01-01', 'NaT'], dtype='M8[D]')
+    >>> y = saveload(x); y.dtype, str(y[0]), str(y[1])
+    (dtype('<M8[D]'), '2006-01-01', 'NaT')
+    >>> loadnode().atom.dtype
+    dtype('int64')
+
+    >>> saveload(numpy.array([['a', 'b\x00c'], ['', 'd']], dtype=object))
+    array([['a', 'b\x00c'],
+           ['', 'd']], dtype=object)
+    >>> type(loadnode()) # doctest: +ELLIPSIS
+    <class 'tables...VLArray'>
+    >>> saveload(numpy.array([1, 'a', None], dtype=object))
+    array([1, 'a', None], dtype=object)
+
+Sparse matrices are saved as their component arrays, and rows of CSR
+matrices can be loaded without reading the whole matrix:
+
+    >>> try: import scipy.sparse
+    ... except ImportError: scipy = None
+    >>> if scipy is not None:
+    ...     x = scipy.sparse.csr_matrix(numpy.arange(12.).reshape(4, 3))
+    ...     for fmt in ['csr', 'csc', 'coo']:
+    ...         y = saveload(x.asformat(fmt))
+    ...         assert y.format == fmt and (y != x).nnz == 0
+    ...     y = saveload(x)
+    ...     y = p.load_sparse_rows('hdf5test.h5', '/obj', 1, 3)
+    ...     assert (y != x[1:3]).nnz == 0
+
+
+Contiguous numpy arrays can be memory-mapped instead of read (h5py is
+needed for finding the data offset):
+
+    >>> import numpy
+    >>> try: import h5py
+    ... except ImportError: h5py = None
+    >>> x = saveload(numpy.arange(10.))
+    >>> y = p.load('hdf5test.h5', '/obj', mmap=True)
+    >>> isinstance(y, numpy.memmap) or h5py is None
+    True
+    >>> float(y[3])
+    3.0
+
+Arrays can also be read into preallocated buffers, given either by path
+or by a previously loaded object of the same structure:
+
+    >>> buf = numpy.zeros(10)
+    >>> y = p.load('hdf5test.h5', '/obj', out={'/obj': buf})
+    >>> y is buf, float(buf[3])
+    (True, 3.0)
+
+The buffers may be strided or of the other byte order, but not read-only:
+
+    >>> buf = numpy.zeros((10, 2))
+    >>> y = p.load('hdf5test.h5', '/obj', out={'/obj': buf[:, 1]})
+    >>> float(buf[3, 1])
+    3.0
+    >>> buf = numpy.zeros(10, dtype='>f8')
+    >>> y = p.load('hdf5test.h5', '/obj', out={'/obj': buf})
+    >>> y is buf, float(buf[3])
+    (True, 3.0)
+    >>> buf.flags.writeable = False
+    >>> y = p.load('hdf5test.h5', '/obj', out={'/obj': buf})
+    Traceback (most recent call last):
+      ...
+    ValueError: out array for /obj is read-only
+
+    >>> x = saveload({'a': numpy.arange(3.), 'b': [numpy.arange(2), None]})
+    >>> y = p.load('hdf5test.h5', '/obj', target=x)
+    >>> y['a'] is x['a'], y['b'][0] is x['b'][0]
+    (True, True)
+
+    >>> y = p.load('hdf5test.h5', '/obj', out={'/obj/a': numpy.zeros(4)})
+    Traceback (most recent call last):
+      ...
+    ValueError: shape mismatch for /obj/a: (3,) in file, (4,) in out
+
+    >>> x = saveload({'w': [numpy.zeros(3), numpy.ones(3)]})
+    >>> y = p.load('hdf5test.h5', '/obj', target=x)
+    >>> y['w'][0] is x['w'][0], y['w'][1] is x['w'][1]
+    (True, True)
+
+The arrays are found wherever the layout puts them: in subclasses, in
+dicts with keys that are not names, and in containers split into
+buckets:
+
+    >>> x = saveload([Point(numpy.zeros(2), 1),
+    ...               collections.OrderedDict([('a', numpy.zeros(2))]),
+    ...               {1: numpy.zeros(2), 2: numpy.ones(2)},
+    ...               {1: numpy.zeros(2), 'b': None}])
+    >>> y = p.load('hdf5test.h5', '/obj', target=x)
+    >>> [y[0].x is x[0].x, y[1]['a'] is x[1]['a'], y[2][2] is x[2][2],
+    ...  y[3][1] is x[3][1]]
+    [True, True, True, True]
+
+    >>> os.unlink('hdf5test.h5')
+    >>> x = [[numpy.zeros(2), None] for i in range(5)]
+    >>> x.append(dict(('k%d' % i, numpy.ones(2)) for i in range(5)))
+    >>> p.dump(x, 'hdf5test.h5', '/obj', bucket_size=3)
+    >>> x = p.load('hdf5test.h5', '/obj')
+    >>> y = p.load('hdf5test.h5', '/obj', target=x)
+    >>> y[4][0] is x[4][0], y[5]['k4'] is x[5]['k4']
+    (True, True)
+
+Arrays packed into one, as in lists of equal-shape arrays, are mapped
+and read into buffers one by one too:
+
+    >>> x = saveload([numpy.arange(10.), numpy.arange(10.)])
+    >>> y = p.load('hdf5test.h5', '/obj', mmap=True)
+    >>> isinstance(y[1], numpy.memmap) or h5py is None
+    True
+    >>> buf = numpy.zeros(10)
+    >>> y = p.load('hdf5test.h5', '/obj', out={'/obj/_1': buf})
+    >>> y[1] is buf, float(buf[3])
+    (True, 3.0)
+
+
+Backends
+--------
+
+Files can also be written with h5py, if it is available, and read back
+with PyTables:
+
+    >>> def saveload_h5py(obj):
+    ...     try: os.unlink('hdf5test.h5')
+    ...     except OSError: pass
+    ...     p.dump(obj, 'hdf5test.h5', '/obj', backend='h5py')
+    ...     return p.load('hdf5test.h5', '/obj')
+    >>> if h5py is None: saveload_h5py = saveload
+
+    >>> y = saveload_h5py({'a': [1, 2, 'b'], '..': (0.5, u'c', 3L), 'd': None})
+    >>> y = y.items(); y.sort(); y
+    [('..', (0.5, u'c', 3L)), ('a', [1, 2, 'b']), ('d', None)]
+    >>> x = saveload_h5py(numpy.arange(5))
+    >>> x, x.dtype
+    (array([0, 1, 2, 3, 4]), dtype('int64'))
+
+    >>> class Cls(object):
+    ...     def __init__(self): self.foo = [1, 'x']
+    >>> modulelevel(Cls)
+    >>> x = Cls()
+    >>> y = saveload_h5py([x, x])
+    >>> y[0].foo, y[0] is y[1]
+    ([1, 'x'], True)
+
+Bools are stored as PyTables stores them, so they keep their type both
+ways:
+
+    >>> def saveload_tables_h5py(obj):
+    ...     try: os.unlink('hdf5test.h5')
+    ...     except OSError: pass
+    ...     p.dump(obj, 'hdf5test.h5', '/obj', backend='tables')
+    ...     return p.load('hdf5test.h5', '/obj', backend='h5py')
+    >>> if h5py is None: saveload_tables_h5py = saveload
+
+    >>> x = {'a': numpy.arange(4) % 2 == 0, 'b': [numpy.bool_(True), 1]}
+    >>> for y in saveload_h5py(x), saveload_tables_h5py(x):
+    ...     y['a'], [type(item).__name__ for item in y['b']]
+    (array([ True, False,  True, False]), ['bool_', 'int'])
+    (array([ True, False,  True, False]), ['bool_', 'int'])
+
+
+In-memory files
+---------------
+
+Objects can be dumped to and loaded from HDF5 file images in memory:
+
+    >>> data = p.dumps({'a': [1, 2, 3], 'b': 'foo'})
+    >>> data[:8]
+    '\x89HDF\r\n\x1a\n'
+    >>> y = p.loads(data)
+    >>> y = y.items(); y.sort(); y
+    [('a', [1, 2, 3]), ('b', 'foo')]
+
+
+Large containers
+----------------
+
+The items of long lists and dicts can be spread over subgroups:
+
+    >>> os.unlink('hdf5test.h5')
+    >>> x = [[i, None] for i in range(25)]
+    >>> p.dump(x, 'hdf5test.h5', '/obj', bucket_size=10)
+    >>> p.load('hdf5test.h5', '/obj') == x
+    True
+    >>> f = tables.openFile('hdf5test.h5', 'r')
+    >>> sorted(f.getNode('/obj')._v_children.keys())
+    ['_b0', '_b1', '_b2']
+    >>> sorted(f.getNode('/obj/_b2')._v_children.keys())
+    ['_20', '_21', '_22', '_23', '_24']
+    >>> f.close()
+
+    >>> os.unlink('hdf5test.h5')
+    >>> x = dict((str(i), [i, None]) for i in range(25))
+    >>> p.dump(x, 'hdf5test.h5', '/obj', bucket_size=10)
+    >>> p.load('hdf5test.h5', '/obj') == x
+    True
+    >>> p.load_item('hdf5test.h5', '/obj', '7')
+    [7, None]
+    >>> f = tables.openFile('hdf5test.h5', 'r')
+    >>> f.getNode('/obj')._v_attrs.buckets
+    3
+    >>> f.close()
+
+
+Class table
+-----------
+
+Classes of instances can be named once per file, instead of once per
+instance:
+
+    >>> os.unlink('hdf5test.h5')
+    >>> class Foo(object):
+    ...     def __init__(self, a):
+    ...         self.a = a
+    >>> modulelevel(Foo)
+    >>> x = [Foo(1), Foo(2)]
+    >>> p.dump(x, 'hdf5test.h5', '/obj', class_table=True)
+    >>> y = p.load('hdf5test.h5', '/obj')
+    >>> [type(item).__name__ for item in y], [item.a for item in y]
+    (['Foo', 'Foo'], [1, 2])
+    >>> f = tables.openFile('hdf5test.h5', 'r')
+    >>> f.getNode('/obj/_1')._v_attrs.cls_id
+    0
+    >>> sorted(f.getNode('/obj/_1')._v_children.keys())
+    ['a']
+    >>> f.close()
+    >>> p.load('hdf5test.h5', '/hdf5pickle_classes')
+    ['__main__\nFoo']
+
+
+Slots
+-----
+
+Values of ``__slots__`` are stored in the instance group, as for
+``__dict__``:
+
+    >>> os.unlink('hdf5test.h5')
+    >>> class Bar(object):
+    ...     __slots__ = ('a', 'b')
+    >>> modulelevel(Bar)
+    >>> x = Bar()
+    >>> x.a, x.b = 1, 'foo'
+    >>> p.dump(x, 'hdf5test.h5', '/obj')
+    >>> y = p.load('hdf5test.h5', '/obj')
+    >>> type(y).__name__, y.a, y.b
+    ('Bar', 1, 'foo')
+    >>> f = tables.openFile('hdf5test.h5', 'r')
+    >>> f.getNode('/obj')._v_attrs.slots
+    1
+    >>> sorted(f.getNode('/obj')._v_children.keys())
+    ['__', 'a', 'b']
+    >>> f.close()
+
+
+Lists of instances
+------------------
+
+Many instances of one class, with simple attributes, are stored as one
+array per attribute:
+
+    >>> os.unlink('hdf5test.h5')
+    >>> x = [Foo(i) for i in range(10)]
+    >>> x.extend([Foo([1]), x[2]])
+    >>> p.dump(x, 'hdf5test.h5', '/obj')
+    >>> y = p.load('hdf5test.h5', '/obj')
+    >>> [item.a for item in y]
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, [1], 2]
+    >>> type(y[0]).__name__, y[11] is y[2]
+    ('Foo', True)
+    >>> f = tables.openFile('hdf5test.h5', 'r')
+    >>> f.getNode('/obj/__/attrs/a').read()
+    array([0, 1, 2, 3, 4, 5, 6, 7, 8, 9])
+    >>> sorted(f.getNode('/obj')._v_children.keys())
+    ['_10', '_11', '__']
+    >>> f.close()
+
+References to array attributes of such items are kept:
+
+    >>> x = [Foo(numpy.arange(3) + i) for i in range(10)]
+    >>> y = saveload([x, x[4].a])
+    >>> y[1] is y[0][4].a, y[1].tolist()
+    (True, [4, 5, 6])
+    >>> y = saveload([x[4].a, x])
+    >>> y[0] is y[1][4].a
+    True
+
+
+String pool
+-----------
+
+Strings and dict keys that are not valid names can be stored once per
+file, and referred to by index:
+
+    >>> os.unlink('hdf5test.h5')
+    >>> x = {'/a/b': 'http://x', '/c/d': 'http://x' + '', u'\xf8': u'\xf8'}
+    >>> p.dump(x, 'hdf5test.h5', '/obj', string_pool=True)
+    >>> p.dump(['http://x', 1], 'hdf5test.h5', '/obj2', string_pool=True)
+    >>> p.load('hdf5test.h5', '/obj') == x
+    True
+    >>> p.load('hdf5test.h5', '/obj2')
+    ['http://x', 1]
+    >>> sorted(p.load('hdf5test.h5', '/hdf5pickle_strings'))
+    ['/a/b', '/c/d', 'http://x', '\xc3\xb8']
+
 
 Cleanup
 -------